@@ -0,0 +1,2 @@
+# Benchmarks for the joueur core. These are not part of the client that plays
+# on the game server, run them via `python3 -m benchmarks.<name>`.
@@ -0,0 +1,82 @@
+# Memory benchmark: plays a long synthetic Stardash game where projectiles are
+# constantly created and removed, and reports how much memory the game state
+# retains. Run via `python3 -m benchmarks.memory [turns]`.
+
+import sys
+import tracemalloc
+from joueur.game_manager import GameManager
+from games.stardash import Game
+
+DELTA_REMOVED = '&RM'
+DELTA_LIST_LENGTH = '&LEN'
+
+PROJECTILES_PER_TURN = 20
+PROJECTILE_LIFETIME = 5
+
+
+def _projectile_id(turn, i):
+    return str(1000 + turn * PROJECTILES_PER_TURN + i)
+
+
+def _turn_delta(turn):
+    game_objects = {}
+    alive = []
+    for past in range(max(0, turn - PROJECTILE_LIFETIME + 1), turn + 1):
+        for i in range(PROJECTILES_PER_TURN):
+            alive.append(_projectile_id(past, i))
+
+    for i in range(PROJECTILES_PER_TURN):
+        id = _projectile_id(turn, i)
+        game_objects[id] = {
+            'id': id,
+            'gameObjectName': 'Projectile',
+            'logs': {DELTA_LIST_LENGTH: 0},
+            'energy': 10,
+            'fuel': 100,
+            'x': turn + i,
+            'y': turn - i,
+        }
+
+    expired = turn - PROJECTILE_LIFETIME
+    if expired >= 0:
+        for i in range(PROJECTILES_PER_TURN):
+            game_objects[_projectile_id(expired, i)] = DELTA_REMOVED
+
+    projectiles = {DELTA_LIST_LENGTH: len(alive)}
+    for index, id in enumerate(alive):
+        projectiles[str(index)] = {'id': id}
+
+    return {
+        'currentTurn': turn,
+        'gameObjects': game_objects,
+        'projectiles': projectiles,
+    }
+
+
+def run(turns=1000):
+    game = Game()
+    manager = GameManager(game)
+    manager.set_constants({
+        'DELTA_REMOVED': DELTA_REMOVED,
+        'DELTA_LIST_LENGTH': DELTA_LIST_LENGTH,
+    })
+
+    tracemalloc.start()
+    baseline = None
+    for turn in range(turns):
+        manager.apply_delta_state(_turn_delta(turn))
+        if turn == PROJECTILE_LIFETIME:
+            baseline = tracemalloc.get_traced_memory()[0]
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('turns:                {}'.format(turns))
+    print('live game objects:    {}'.format(len(game.game_objects)))
+    print('memory after warm up: {:.1f} KiB'.format((baseline or 0) / 1024))
+    print('memory at end:        {:.1f} KiB'.format(current / 1024))
+    print('peak memory:          {:.1f} KiB'.format(peak / 1024))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,85 @@
+# Runs the benchmark suite, optionally saving the results so revisions can be
+# compared. Run via `python3 -m benchmarks.run [-k FILTER] [--save] [--compare REV]`
+import argparse
+import json
+import os
+import subprocess
+import time
+from benchmarks.suite import all_benchmarks
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.benchmarks')
+
+
+# times a benchmark, returning the best seconds per call over several repeats
+def measure(prepare, run, repeat=3, min_time=0.1):
+    number = 1
+    while True:
+        inputs = prepare(number)
+        started = time.perf_counter()
+        for input in inputs:
+            run(input)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    best = elapsed / number
+    for i in range(repeat - 1):
+        inputs = prepare(number)
+        started = time.perf_counter()
+        for input in inputs:
+            run(input)
+        best = min(best, (time.perf_counter() - started) / number)
+    return best
+
+
+def revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL
+        ).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _format(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{:.2f} {}'.format(seconds / scale, unit)
+    return '{:.0f} ns'.format(seconds / 1e-9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the joueur benchmark suite.')
+    parser.add_argument('-k', dest='filter', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--save', action='store_true', help='save the results for the current git revision')
+    parser.add_argument('--compare', dest='compare', default=None, help='a saved git revision to compare against')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(os.path.join(RESULTS_PATH, args.compare + '.json')) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    for name, param, function in all_benchmarks():
+        if args.filter not in name:
+            continue
+        prepare, run = function(param)
+        results[name] = measure(prepare, run)
+
+        line = '{:<48} {:>12}'.format(name, _format(results[name]))
+        if name in baseline:
+            line += '   {:.2f}x'.format(baseline[name] / results[name])
+        print(line, flush=True)
+
+    if args.save:
+        if not os.path.isdir(RESULTS_PATH):
+            os.makedirs(RESULTS_PATH)
+        with open(os.path.join(RESULTS_PATH, revision() + '.json'), 'w') as f:
+            json.dump({'revision': revision(), 'time': time.time(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
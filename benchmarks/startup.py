@@ -0,0 +1,125 @@
+# Startup benchmark: how long the client takes from being launched to being
+# ready to play, i.e. sending `play`, against a server that takes `latency`
+# seconds to answer the handshake. Compares the client loading the game while
+# connecting (preloaded) against loading it only once the server named it
+# (sequential, by giving an alias no game module matches), and against
+# requesting a session from a client already serving workers (forked).
+# Run via `python3 -m benchmarks.startup [--latency 0.05] [-n 5] [game ...]`.
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from benchmarks import states
+from joueur.run import request_worker
+
+EOT_CHAR = chr(4)
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _receive(connection, buffer):
+    while EOT_CHAR not in buffer[0]:
+        data = connection.recv(4096)
+        if not data:
+            return None
+        buffer[0] += data.decode('utf-8')
+    message, buffer[0] = buffer[0].split(EOT_CHAR, 1)
+    return json.loads(message)
+
+
+# answers the handshake of one client, returning when it sent `play`
+def _handshake(listener, game_name, latency, ready):
+    connection, address = listener.accept()
+    buffer = ['']
+    try:
+        _receive(connection, buffer) # alias
+        time.sleep(latency)
+        connection.sendall((json.dumps({'event': 'named', 'data': game_name}) + EOT_CHAR).encode('utf-8'))
+        if _receive(connection, buffer) is not None:
+            ready.append(time.perf_counter())
+    finally:
+        connection.close()
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# times launching a client, via launch(server address) returning its pid or process
+def time_to_ready(game_name, latency, launch):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    ready = []
+    server = threading.Thread(target=_handshake, args=(listener, game_name, latency, ready))
+    server.start()
+
+    started = time.perf_counter()
+    client = launch('127.0.0.1:{}'.format(listener.getsockname()[1]))
+    server.join()
+    if isinstance(client, subprocess.Popen):
+        client.kill()
+        client.wait()
+    listener.close()
+    return ready[0] - started if ready else float('nan')
+
+
+def _launch_process(alias):
+    return lambda address: subprocess.Popen(
+        [sys.executable, 'main.py', alias, '-s', address],
+        cwd=_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def _serve_workers(game_name):
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, 'main.py', game_name, '--serveWorkers', str(port)],
+        cwd=_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    while True:
+        try:
+            socket.create_connection(('localhost', port)).close()
+            break
+        except OSError:
+            time.sleep(0.01)
+    return process, port
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures how long the client takes to be ready to play.')
+    parser.add_argument('games', nargs='*', help='the games to measure, defaults to all of them')
+    parser.add_argument('--latency', type=float, default=0.05, help='the seconds the server takes to answer alias')
+    parser.add_argument('-n', dest='repeat', type=int, default=5, help='the number of launches to take the median of')
+    args = parser.parse_args()
+
+    print('{:<14} {:>12} {:>12} {:>12}'.format('game', 'preloaded', 'sequential', 'forked'))
+    for game_name in args.games or states.game_names():
+        named = states.game_module(game_name).Game().name
+        workers, port = _serve_workers(game_name)
+        try:
+            launches = [
+                _launch_process(game_name),
+                _launch_process(game_name + '-sequential'),
+                lambda address: request_worker(port, server=address),
+            ]
+            medians = [
+                statistics.median(time_to_ready(named, args.latency, launch) for i in range(args.repeat))
+                for launch in launches
+            ]
+        finally:
+            workers.kill()
+            workers.wait()
+        print('{:<14} {:>9.1f} ms {:>9.1f} ms {:>9.1f} ms'.format(
+            game_name, *[median * 1000 for median in medians]
+        ), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# Game states for benchmarks, generated by joueur.synthetic from each game's
+# classes.
+import importlib
+import os
+from joueur.synthetic import SyntheticGame, CONSTANTS
+
+
+def game_names():
+    games_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'games')
+    return sorted(
+        name for name in os.listdir(games_path)
+        if os.path.isfile(os.path.join(games_path, name, '__init__.py'))
+    )
+
+
+def game_module(game_name):
+    return importlib.import_module('games.' + game_name)
+
+
+def initial_delta(game_name, objects, seed=0):
+    """Creates the first delta of a game, with roughly `objects` game objects,
+    a square map of tiles for the games that have one."""
+    return SyntheticGame(game_name, objects=objects, seed=seed).initial_delta()
+
+
+def game_deltas(game_name, objects, turns, churn=None, seed=0):
+    """Creates the first delta of a game followed by `turns` per turn deltas,
+    which change a fraction of the numeric fields and create and remove the
+    churned game objects."""
+    synthetic = SyntheticGame(game_name, objects=objects, churn=churn, seed=seed)
+    initial = synthetic.initial_delta()
+    return initial, [synthetic.turn_delta() for i in range(turns)]
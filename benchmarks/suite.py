@@ -0,0 +1,300 @@
+# The benchmarks of the joueur core's hot paths. Each benchmark is a function
+# taking one of its params and returning a (prepare, run) pair. The runner
+# calls prepare(number) outside of the timing to get the input for each of
+# the `number` timed calls to run(input).
+import contextlib
+import copy
+import io
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+from benchmarks import states
+from joueur.synthetic import SyntheticGame
+from joueur.base_ai import BaseAI
+from joueur.client import Client, EOT_CHAR, UNIX_PREFIX
+from joueur.game_manager import GameManager
+from joueur.serializer import serialize, deserialize
+from joueur.utilities import camel_case_converter
+
+SIZES = [100, 1000, 4000]
+_benchmarks = []
+
+
+def benchmark(params=None):
+    """Registers a benchmark function, run once for each of its params."""
+    def decorator(function):
+        _benchmarks.append((function, params or [None]))
+        return function
+    return decorator
+
+
+def all_benchmarks():
+    """Gets every registered (name, param, function)."""
+    found = []
+    for function, params in _benchmarks:
+        for param in params:
+            name = function.__name__
+            if param is not None:
+                name += '[{}]'.format(param)
+            found.append((name, param, function))
+    return found
+
+
+def _same(value):
+    return lambda number: [value] * number
+
+
+def _fresh_manager(game_name, cold_fields=None):
+    manager = GameManager(states.game_module(game_name).Game(), cold_fields)
+    manager.set_constants(states.CONSTANTS)
+    return manager
+
+
+def _game_with_state(game_name, objects):
+    manager = _fresh_manager(game_name)
+    manager.apply_delta_state(states.initial_delta(game_name, objects))
+    return manager
+
+
+_GAME_SIZES = ['{}-{}'.format(game, size) for game in states.game_names() for size in SIZES]
+
+
+def _split(param):
+    game_name, size = param.rsplit('-', 1)
+    return game_name, int(size)
+
+
+@benchmark(_GAME_SIZES)
+def merge_initial_state(param):
+    game_name, size = _split(param)
+    delta = states.initial_delta(game_name, size)
+
+    def prepare(number):
+        return [(_fresh_manager(game_name), copy.deepcopy(delta)) for i in range(number)]
+
+    def run(input):
+        input[0].apply_delta_state(input[1])
+
+    return prepare, run
+
+
+@benchmark(_GAME_SIZES)
+def merge_turn_delta(param):
+    game_name, size = _split(param)
+    initial, deltas = states.game_deltas(game_name, size, 50)
+    manager = _fresh_manager(game_name)
+    manager.apply_delta_state(initial)
+
+    def prepare(number):
+        return [copy.deepcopy(deltas[i % len(deltas)]) for i in range(number)]
+
+    return prepare, manager.apply_delta_state
+
+
+@benchmark([10, 100, 1000])
+def merge_churned_turn(churn):
+    # the deltas have to be merged in order, so each prepared batch continues the same game
+    synthetic = SyntheticGame('stardash', counts={'Body': 5000, 'Projectile': 5000}, churn={'Projectile': churn})
+    manager = _fresh_manager('stardash')
+    manager.apply_delta_state(synthetic.initial_delta())
+
+    def prepare(number):
+        return [synthetic.turn_delta() for i in range(number)]
+
+    return prepare, manager.apply_delta_state
+
+
+# the fields of pirates the AI rarely reads, merged lazily when cold
+_PIRATES_COLD_FIELDS = {'GameObject': ['logs'], 'Tile': ['decoration']}
+
+
+@benchmark(['hot', 'cold'])
+def merge_cold_fields(mode):
+    cold_fields = _PIRATES_COLD_FIELDS if mode == 'cold' else None
+    delta = states.initial_delta('pirates', 4000)
+
+    def prepare(number):
+        return [(_fresh_manager('pirates', cold_fields), copy.deepcopy(delta)) for i in range(number)]
+
+    def run(input):
+        input[0].apply_delta_state(input[1])
+
+    return prepare, run
+
+
+@benchmark([10, 100, 1000])
+def serialize_game_objects(size):
+    manager = _game_with_state('pirates', size * 4)
+    objects = list(manager.game.game_objects.values())[:size]
+    args = {
+        'target': objects[0],
+        'amount': 3,
+        'targets': {str(i): obj for i, obj in enumerate(objects)}
+    }
+    return _same(args), serialize
+
+
+@benchmark([10, 100, 1000])
+def serialize_deep_args(length):
+    # e.g. a long pirates path, and a plan of moves along it
+    manager = _game_with_state('pirates', length * 4)
+    tiles = manager.game.tiles[:length]
+    args = {
+        'path': tiles,
+        'plan': [(tile, 'move', (tile.x, tile.y)) for tile in tiles],
+        'unit': manager.game.units[0],
+    }
+    return _same(args), serialize
+
+
+@benchmark([10, 100, 1000])
+def deserialize_game_objects(size):
+    manager = _game_with_state('pirates', size * 4)
+    ids = list(manager.game.game_objects)[:size]
+    data = [{'id': id} for id in ids]
+    game = manager.game
+    return _same(data), lambda d: deserialize(d, game)
+
+
+@benchmark([1000, 10000])
+def deserialize_large_result(size):
+    # e.g. a batch of stardash next_x values returned by run_on_server
+    game = _game_with_state('stardash', 100).game
+    data = {'xs': [i * 0.5 for i in range(size)], 'bodies': [{'id': id} for id in list(game.game_objects)[:10]]}
+    return _same(data), lambda d: deserialize(d, game)
+
+
+@benchmark()
+def camel_case(param):
+    names = ['gameObjectName', 'timeRemaining', 'currentPlayer', 'x', 'reasonWon']
+    return _same(names), lambda n: [camel_case_converter(name) for name in n]
+
+
+# feeds pre-recorded data to the client instead of a real socket
+class _FakeSocket():
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._index = 0
+
+    def recv(self, size):
+        chunk = self._chunks[self._index]
+        self._index += 1
+        return chunk
+
+
+@benchmark([10, 100, 1000])
+def frame_events(events):
+    initial, deltas = states.game_deltas('stardash', 1000, events)
+    manager = _fresh_manager('stardash')
+    manager.apply_delta_state(initial)
+    stream = ''.join(
+        json.dumps({'event': 'delta', 'data': delta}) + EOT_CHAR
+        for delta in deltas
+    ).encode('utf-8')
+    chunks = [stream[i:i + 1024] for i in range(0, len(stream), 1024)]
+
+    def prepare(number):
+        clients = []
+        for i in range(number):
+            client = Client()
+            client.socket = _FakeSocket(chunks)
+            clients.append(client)
+        return clients
+
+    def run(client):
+        parsed = 0
+        while parsed < events:
+            client.wait_for_events()
+            parsed += len(client._events_stack)
+            client._events_stack = []
+
+    return prepare, run
+
+
+class _AI(BaseAI):
+    def run_turn(self):
+        return True
+
+
+@benchmark()
+def do_order(param):
+    ai = _AI(None)
+    return _same(('runTurn', [])), lambda order: ai._do_order(*order)
+
+
+# answers every `run` event with a `ran` one, like a server would
+def _answer_runs(family, address, listening):
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.bind(address)
+    listener.listen(1)
+    listening.set()
+    connection, ignored = listener.accept()
+    listener.close()
+    if family == socket.AF_INET:
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    eot = EOT_CHAR.encode('utf-8')
+    ran = (json.dumps({'event': 'ran', 'data': True}) + EOT_CHAR).encode('utf-8')
+    buffer = b''
+    while True:
+        data = connection.recv(4096)
+        if not data:
+            break
+        buffer += data
+        while eot in buffer:
+            message, buffer = buffer.split(eot, 1)
+            connection.sendall(ran)
+    connection.close()
+
+
+# a client connected to an _answer_runs server, and a game object to run commands on
+def _client_of_answering_server(transport):
+    # the server is another process, like it would be, so it does not share our GIL
+    if transport == 'unix':
+        path = os.path.join(tempfile.mkdtemp(), 'server.sock')
+        family, address = socket.AF_UNIX, path
+        hostname, port = UNIX_PREFIX + path, None
+    else:
+        family, address = socket.AF_INET, ('127.0.0.1', _free_port())
+        hostname, port = address
+    listening = multiprocessing.Event()
+    server = multiprocessing.Process(target=_answer_runs, args=(family, address, listening))
+    server.daemon = True
+    server.start()
+    listening.wait()
+
+    manager = _game_with_state('chess', 2)
+    caller = manager.game.players[0]
+    client = Client()
+    with contextlib.redirect_stdout(io.StringIO()):
+        client.connect(hostname, port)
+    client.setup(manager.game, None, manager)
+    return client, caller
+
+
+@benchmark(['tcp', 'unix'])
+def run_on_server_round_trip(transport):
+    client, caller = _client_of_answering_server(transport)
+    return _same('move'), lambda name: client.run_on_server(caller, name, {'piece': caller})
+
+
+@benchmark(['sequential', 'batched'])
+def run_on_server_20_commands(mode):
+    client, caller = _client_of_answering_server('tcp')
+
+    def run(name):
+        if mode == 'batched':
+            with client.batch():
+                results = [client.run_on_server(caller, name, {'piece': caller}) for i in range(20)]
+            return [result.value for result in results]
+        return [client.run_on_server(caller, name, {'piece': caller}) for i in range(20)]
+
+    return _same('move'), run
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
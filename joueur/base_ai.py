@@ -2,19 +2,42 @@
 from joueur.utilities import camel_case_converter
 import joueur.error_code as error_code
 import joueur.ansi_color_coder as color
+from joueur.double_buffer import DoubleBufferedGame
+from joueur.base_game_object import BaseGameObject
+from joueur.deadline import DeadlineManager
+import threading
 import sys
 
 
 # @class BaseAI: the basic AI functions that are the same between games
 class BaseAI:
+    # the fields the AI rarely reads, by class name, e.g. {'Tile': ['decoration']}.
+    # Their deltas are only merged once the AI first reads them, and they are
+    # left out of the game's state hash.
+    cold_fields = {}
+
     def __init__(self, game):
         self._game = game
         self._player = None
         self._settings = {}
+        self._game_manager = None
+        self._double_buffered = None
+        self._ponder_thread = None
+        self._ponder_wake = threading.Event()
+        self._ponder_cancelled = threading.Event()
+        self._ponder_listening = False
+        self._ponder_result = None
+        self._deadlines = DeadlineManager()
+        self._turn_budget = None
+        self._worker_pool = None
+        self._shared_game_state = None
 
     def set_player(self, player):
         self._player = player
 
+    def set_game_manager(self, manager):
+        self._game_manager = manager
+
     @property
     def game(self):
         """The reference to the Game instance this AI is playing.
@@ -52,6 +75,196 @@ class BaseAI:
         """
         return self._settings[key] if key in self._settings else None
 
+    def double_buffered_game(self):
+        """Gets the double buffered copies of the game for reading from
+        background threads, creating them on first use. Background threads
+        must never read `self.game`, as the client modifies it while merging
+        deltas. Instead they should use `with buffered.read() as game:` to
+        get a copy of the game that stays consistent while they hold it.
+
+        Returns:
+            DoubleBufferedGame: the double buffered copies of the game
+        """
+        if self._double_buffered is None:
+            self._double_buffered = DoubleBufferedGame(self._game_manager)
+        return self._double_buffered
+
+    @property
+    def turn_budget(self):
+        """The time budget for the current order, computed from your
+        player's remaining time, the expected number of turns left, and the
+        measured network overhead. Use it for anytime searches via
+        `while self.turn_budget.ok(): ...`, or to hard cancel code via
+        `with self.turn_budget.hard_limit(): ...`. None outside of orders.
+
+        :rtype: joueur.deadline.TurnBudget
+        """
+        return self._turn_budget
+
+    def _start_turn(self):
+        if self._player is not None:
+            self._turn_budget = self._deadlines.start_turn(self._game, self._player)
+
+    def _finish_turn(self):
+        self._deadlines.finish_turn()
+        self._turn_budget = None
+
+    @property
+    def ponder_result(self):
+        """The latest value returned by `ponder` while waiting for the
+        opponent, or None if nothing was pondered. Game objects in it have
+        been swapped for the same game objects in `self.game`.
+
+        :rtype: object
+        """
+        return self._ponder_result
+
+    # intended to be overridden by the AI class
+    def ponder(self, game, stop):
+        """Called on a background thread while waiting for the opponent's
+        turn, so you can think ahead. Whatever it returns is available via
+        `self.ponder_result` in your next turn. It is called again each time
+        the game state changes.
+
+        Args:
+            game (Game): A read consistent copy of the game. Never read
+                `self.game` in here, the client is modifying it.
+            stop (threading.Event): Set once you should return, because the
+                game changed or it is your turn. Check it regularly.
+
+        Returns:
+            object: anything you want to carry over into your turn
+        """
+        return None
+
+    def _start_pondering(self):
+        if type(self).ponder is BaseAI.ponder:
+            return # they don't ponder, so don't pay for it
+
+        buffered = self.double_buffered_game()
+        if not self._ponder_listening:
+            self._ponder_listening = True
+            # wake once the new epoch is published, not once merged, else the
+            # ponder thread would read the front buffer it already pondered
+            buffered.add_publish_listener(
+                lambda epoch: self._ponder_wake.set()
+            )
+
+        import joueur.client # avoid circular imports (sphinx won't build docs otherwise)
+        self._ponder_result = None
+        self._ponder_cancelled.clear()
+        self._ponder_thread = threading.Thread(
+            target=self._ponder_loop,
+            args=(buffered, joueur.client.current())
+        )
+        self._ponder_thread.daemon = True
+        self._ponder_thread.start()
+
+    def _stop_pondering(self):
+        if self._ponder_thread is None:
+            return
+
+        self._ponder_cancelled.set()
+        self._ponder_wake.set()
+        self._ponder_thread.join()
+        self._ponder_thread = None
+
+        self._ponder_result = _rebind(self._ponder_result, self._game)
+
+    def _ponder_loop(self, buffered, client):
+        import joueur.client # avoid circular imports (sphinx won't build docs otherwise)
+        joueur.client.set_current(client) # so errors end this session, not every session
+        pondered_version = None
+        while not self._ponder_cancelled.is_set():
+            self._ponder_wake.clear()
+            with buffered.read() as game:
+                if game.version != pondered_version:
+                    pondered_version = game.version
+                    try:
+                        self._ponder_result = self.ponder(game, self._ponder_wake)
+                    except:
+                        error_code.handle_error(
+                            error_code.AI_ERRORED,
+                            sys.exc_info()[0],
+                            "AI caused exception while pondering."
+                        )
+                    continue # the game may have changed while pondering
+
+            self._ponder_wake.wait()
+
+    def batch(self):
+        """Gets a context manager that batches the commands run inside it,
+        e.g. `unit.move(tile)`, sending them to the server back-to-back once
+        it exits, so the whole batch costs about one round trip.
+
+        Inside the batch commands return Deferred results instead. Reading
+        a result's `value`, or its truth value, sends the commands batched
+        so far right away. If the block raises, the commands not sent yet
+        are dropped and their results are None. The game is only updated
+        once the commands have been sent, so a batch should hold commands
+        that do not depend on each other, e.g. moving every unit:
+
+            with self.batch():
+                moved = [unit.move(tile) for unit, tile in plans]
+            failed = [result for result in moved if not result.value]
+
+        Returns:
+            a context manager yielding the Batch
+        """
+        import joueur.client # avoid circular imports (sphinx won't build docs otherwise)
+        return joueur.client.batch()
+
+    def worker_pool(self, processes=None):
+        """Gets the pool of worker processes for searching in parallel,
+        creating it on first use. The same pool is re-used every turn, so
+        call `pool.update(self.game)` once per turn and then
+        `pool.map(search, tasks, self.turn_budget.remaining())`.
+
+        Args:
+            processes (int): The number of worker processes to create the
+                pool with, defaults to the number of CPU cores.
+
+        Returns:
+            WorkerPool: the pool of worker processes
+        """
+        if self._worker_pool is None:
+            from joueur.worker_pool import WorkerPool # multiprocessing is slow to import, and most AIs never need it
+            self._worker_pool = WorkerPool(processes)
+        return self._worker_pool
+
+    def shared_game_state(self):
+        """Gets the columnar copy of the game in shared memory, creating it
+        on first use. It is updated after every delta, and worker processes
+        can read it without any copying via
+        `joueur.shared_state.attach(name).table('Tile').column('x')`, where
+        name is this shared game state's `name`. Reads can overlap a write,
+        so wrap them in `attach(name).read(function)`, which retries them
+        until they are consistent. Requires Python 3.8+.
+
+        Returns:
+            SharedGameState: the shared game state
+        """
+        if self._shared_game_state is None:
+            from joueur.shared_state import SharedGameState
+            self._shared_game_state = SharedGameState(self._game_manager)
+        return self._shared_game_state
+
+    def _release_resources(self):
+        self._stop_pondering()
+        if self._worker_pool is not None:
+            self._worker_pool.close()
+        if self._shared_game_state is not None:
+            self._shared_game_state.close()
+
+    # intended to be overridden by the AI class
+    def warm_up(self):
+        """Called on a background thread once the AI is created, while the
+        client is still joining the game, so you can precompute tables
+        before `start`. Your settings are available but the game state and
+        `self.player` are not. `start` is called once this returns.
+        """
+        pass
+
     # intended to be overridden by the AI class
     def start(self):
         pass
@@ -92,3 +305,14 @@ class BaseAI:
     # intended to be overridden by the AI class
     def end(self):
         pass
+
+
+# swaps game objects from a forked game for the same ones in the given game
+def _rebind(value, game):
+    if isinstance(value, BaseGameObject):
+        return game.get_game_object(value.id)
+    if isinstance(value, (list, tuple, set)):
+        return type(value)(_rebind(v, game) for v in value)
+    if isinstance(value, dict):
+        return {_rebind(k, game): _rebind(v, game) for k, v in value.items()}
+    return value
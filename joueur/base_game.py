@@ -1,10 +1,57 @@
+import copy
+import weakref
 from joueur.delta_mergeable import DeltaMergeable
+import joueur.state_hash as state_hash
 
 
 # @class BaseGame: the basics of any game
 class BaseGame(DeltaMergeable):
     def __init__(self):
         DeltaMergeable.__init__(self)
+        self._state_hash = None # not hashed until first read
+        # the attributes merged lazily per class, see GameManager.set_cold_fields,
+        # and those attributes by their keys in deltas
+        self._cold_fields = {}
+        self._cold_keys = {}
+
+    @property
+    def state_hash(self):
+        """A Zobrist style hash of the entire game state, updated incrementally
+        as deltas are merged. Useful as a key for transposition tables. The
+        game is only hashed once this is first read, so AIs that never read
+        it do not pay for hashing deltas.
+
+        :rtype: int
+        """
+        if self._state_hash is None:
+            self._state_hash = state_hash.full_hash(self)
+        return self._state_hash
+
+    def fork(self):
+        """ creates a deep copy of the game and all its game objects, which
+        the AI may freely modify, e.g. while searching future states. Use
+        `joueur.state_hash.update_field` to modify it while keeping its
+        state_hash up to date.
+
+        Returns:
+            BaseGame: the forked copy of this game
+        """
+        # merge any pending cold fields, the copy must not share their deltas
+        originals = [self] + list(self._game_objects.values())
+        for original in originals:
+            original._materialize_cold()
+
+        # create every copy up front, so deepcopy finds the game objects in
+        # its memo instead of recursing through their references, e.g. the
+        # neighbors of tiles, which would exceed the recursion limit
+        memo = {}
+        for original in originals:
+            memo[id(original)] = type(original).__new__(type(original))
+        for original in originals:
+            forked = memo[id(original)]
+            for name, value in original.__dict__.items():
+                forked.__dict__[name] = copy.deepcopy(value, memo)
+        return memo[id(self)]
 
     def get_game_object(self, id):
         """ gets the game object with the given id, or None
@@ -14,3 +61,16 @@ class BaseGame(DeltaMergeable):
         """
         if id in self.game_objects:
             return self.game_objects[id]
+
+    def get_game_object_ref(self, id):
+        """ gets a weak reference to the game object with the given id, or None.
+        Useful for long lived AI caches, as they will not keep removed game
+        objects alive.
+
+        Returns:
+            weakref.ref to the BaseGameObject in the game with the given id,
+            or None if not found
+        """
+        game_object = self.get_game_object(id)
+        if game_object is not None:
+            return weakref.ref(game_object)
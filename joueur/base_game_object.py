@@ -6,6 +6,17 @@ from joueur.delta_mergeable import DeltaMergeable
 class BaseGameObject(DeltaMergeable):
     def __init__(self):
         DeltaMergeable.__init__(self)
+        self._removed = False
+
+    @property
+    def removed(self):
+        """If the server has removed this game object from the game. Removed
+        game objects are no longer in `game.game_objects` and will never be
+        updated again, so any references you kept to them are stale.
+
+        :rtype: bool
+        """
+        return self._removed
 
     def __str__(self):
         return "{} #{}".format(self.game_object_name, self.id)
@@ -0,0 +1,89 @@
+# Batch: collects the commands the AI runs on game objects, e.g. move and
+# attack, and sends them to the server back-to-back, so a batch of commands
+# costs about one round trip instead of one per command.
+
+
+# @class Deferred: what a command run in a batch returns, until the batch is sent
+class Deferred():
+    __slots__ = ['_batch', '_value', '_resolved']
+
+    def __init__(self, batch):
+        self._batch = batch
+        self._value = None
+        self._resolved = False
+
+    @property
+    def resolved(self):
+        """If the server has already returned the command's result.
+
+        :rtype: bool
+        """
+        return self._resolved
+
+    @property
+    def value(self):
+        """What the command returned, sending the batch right away if it
+        has not been sent yet.
+        """
+        if not self._resolved:
+            self._batch.flush()
+        return self._value
+
+    def _resolve(self, value):
+        self._value = value
+        self._resolved = True
+
+    def __bool__(self):
+        return bool(self.value)
+
+    def __repr__(self):
+        return 'Deferred({!r})'.format(self._value) if self._resolved else 'Deferred(pending)'
+
+
+# @class Batch: the commands run so far that have not been sent to the server yet
+class Batch():
+    def __init__(self, client):
+        self._client = client
+        self._calls = []
+        self._deferred = []
+
+    def __len__(self):
+        return len(self._calls)
+
+    def add(self, caller, function_name, args=None):
+        """Queues a command to run on the server.
+
+        Args:
+            caller (BaseGameObject): The game object running the command.
+            function_name (str): The name of the command, e.g. 'move'.
+            args (dict): The command's arguments.
+
+        Returns:
+            Deferred: the command's result, once the batch has been sent
+        """
+        deferred = Deferred(self)
+        self._calls.append((caller, function_name, args))
+        self._deferred.append(deferred)
+        return deferred
+
+    def flush(self):
+        """Sends every queued command, and waits for their results."""
+        calls, self._calls = self._calls, []
+        deferred, self._deferred = self._deferred, []
+        if not calls:
+            return
+
+        self._client.count('batches')
+        self._client.count('batched_commands', len(calls))
+        for result, value in zip(deferred, self._client.run_on_server_pipelined(calls)):
+            result._resolve(value)
+
+    def discard(self):
+        """Drops every queued command without sending it, their results
+        become None."""
+        if self._calls:
+            self._client.count('batched_commands_dropped', len(self._calls))
+        for result in self._deferred:
+            result._resolve(None)
+        self._calls = []
+        self._deferred = []
@@ -0,0 +1,70 @@
+# Class metadata: what the generated game classes document about their fields,
+# read from the `:rtype:` (and quoted choices like 'land' or 'water') in the
+# docstrings of their properties.
+import re
+import sys
+import joueur.state_hash as state_hash
+
+_RTYPE_RE = re.compile(r':rtype:\s*(\S+)')
+_CHOICE_RE = re.compile(r"'([^'\s]+)'")
+
+_field_types = {}
+_string_choices = {}
+
+
+def _parse_type(rtype, doc):
+    if rtype.startswith('list['):
+        return ('list', _parse_type(rtype[5:-1], ''))
+    if rtype.startswith('dict['):
+        return ('dict', None)
+    if rtype in ('int', 'float', 'bool'):
+        return (rtype, None)
+    if rtype == 'str':
+        return ('str', _CHOICE_RE.findall(doc) or None)
+    if rtype.startswith('games.'):
+        return ('ref', rtype.split('.')[-1])
+    return ('unknown', None)
+
+
+def field_types(cls):
+    """Gets the type of each state field of a game or game object class, from
+    the `:rtype:` in the docstring of its property.
+
+    Args:
+        cls (type): The Game or GameObject class.
+
+    Returns:
+        dict[str, tuple]: (kind, detail) for each private attribute name.
+        kind is 'int', 'float', 'bool', 'str' (detail is the list of quoted
+        choices in the docstring, if any), 'ref' (detail is the class name),
+        'list' (detail is the element type), 'dict', or 'unknown'.
+    """
+    if cls not in _field_types:
+        types = {}
+        for name in state_hash.fields_of(cls):
+            prop = getattr(cls, name[1:], None)
+            doc = (prop.__doc__ or '') if isinstance(prop, property) else ''
+            match = _RTYPE_RE.search(doc)
+            types[name] = _parse_type(match.group(1), doc) if match else ('unknown', None)
+        _field_types[cls] = types
+    return _field_types[cls]
+
+
+def string_choices(cls):
+    """Gets the values documented for each string field of a game or game
+    object class, e.g. a pirates Tile's type is 'water' or 'land'.
+
+    Args:
+        cls (type): The Game or GameObject class.
+
+    Returns:
+        dict[str, dict[str, str]]: for each private attribute name with
+        documented values, each value mapped to its interned copy
+    """
+    if cls not in _string_choices:
+        _string_choices[cls] = {
+            name: {choice: sys.intern(choice) for choice in detail}
+            for name, (kind, detail) in field_types(cls).items()
+            if kind == 'str' and detail
+        }
+    return _string_choices[cls]
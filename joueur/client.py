@@ -1,241 +1,556 @@
+import contextlib
 import socket
 import errno
 import sys
 import os
 import json
+import threading
 import time
 from joueur.serializer import serialize, deserialize
+from joueur.batch import Batch
+from joueur.deadline import client_code
 import joueur.error_code as error_code
 from joueur.game_manager import GameManager
+from joueur.trace import NO_SPAN
 import joueur.ansi_color_coder as color
 
 EOT_CHAR = chr(4)
+UNIX_PREFIX = 'unix:'
+
+
+class SessionEnded(Exception):
+    """Raised to end a session's thread when its game is over or errored,
+    instead of exiting the whole process, when playing multiple sessions."""
+
+    def __init__(self, exit_code):
+        Exception.__init__(self, 'Session ended with code {}'.format(exit_code))
+        self.exit_code = exit_code
+
+
+# Client: talks to the server receiving game information and sending
+# commands to execute. Clients perform no game logic. Each game session is
+# played by its own Client, the module level functions below act on the
+# current thread's Client, or the process wide one by default.
+class Client:
+    def __init__(self):
+        self.socket = None
+        self.hostname = None
+        self.port = None
+        self.game = None
+        self.ai = None
+        self.manager = None
+        self._print_io = False
+        self._received_buffer = ""
+        self._events_stack = []
+        self._buffer_size = 1024
+        self._timeout_time = 1.0
+        self._counters = {}
+        self._profiler = None
+        self._tracer = None
+        self._log_buffer = None
+        self._batch = None
+
+    def connect(self, hostname='localhost', port=3000, print_io=False):
+        """Connects to the server, via TCP, or via a Unix domain socket if
+        the hostname is a 'unix:/path/to/socket' address, for servers on the
+        same machine.
+
+        Args:
+            hostname (str): The host, or unix: address, of the server.
+            port (int): The TCP port of the server, unused for unix: addresses.
+            print_io (bool): If everything sent and received should be printed.
+        """
+        self.hostname = hostname
+        unix_path = hostname[len(UNIX_PREFIX):] if hostname.startswith(UNIX_PREFIX) else None
+        self.port = None if unix_path else int(port)
+
+        self._print_io = print_io
+        self._received_buffer = ""
+        self._events_stack = []
+        self._counters = {}
+
+        address = self.hostname if unix_path else '{}:{}'.format(self.hostname, self.port)
+        print(color.text('cyan') + 'Connecting to:', address + color.reset())
+
+        try:
+            if unix_path:
+                self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            else:
+                self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+                # Silly Windows
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+            # so the blocking on recv doesn't hang forever and other system
+            # interrupts (e.g. keyboard) can be handled
+            self.socket.settimeout(self._timeout_time)
+            self.socket.connect(unix_path or (self.hostname, self.port))
+        except socket.error as e:
+            error_code.handle_error(
+                error_code.COULD_NOT_CONNECT,
+                e,
+                'Could not connect to {}'.format(address)
+            )
 
+    def setup(self, game, ai, manager):
+        self.game = game
+        self.ai = ai
+        self.manager = manager
+
+    def set_profiler(self, profiler):
+        """Sets the profiler to tell which phase the client is in, and
+        starts it on the calling thread.
+
+        Args:
+            profiler (joueur.profiler.Profiler): The profiler, or None.
+        """
+        self._profiler = profiler
+        if profiler:
+            profiler.start()
+
+    def phase(self, name):
+        """Gets a context manager marking what the client is doing for the
+        profiler, if profiling.
+
+        Args:
+            name (str): One of joueur.profiler.PHASES.
+
+        Returns:
+            a context manager entering the phase
+        """
+        return self._profiler.phase(name) if self._profiler else NO_SPAN # a no-op
+
+    def set_tracer(self, tracer):
+        """Sets the tracer to record the client's activity with, written
+        once the session ends.
+
+        Args:
+            tracer (joueur.trace.Tracer): The tracer, or None.
+        """
+        self._tracer = tracer
+
+    def set_log_buffer(self, log_buffer):
+        """Sets the buffer to queue GameObject.log calls in, instead of
+        running each on the server right away.
+
+        Args:
+            log_buffer (joueur.log_buffer.LogBuffer): The buffer, or None.
+        """
+        self._log_buffer = log_buffer
+
+    # a span of the tracer with the current turn as metadata, if tracing
+    def _span(self, name, **args):
+        if not self._tracer:
+            return NO_SPAN
+        args['turn'] = getattr(self.game, 'current_turn', None)
+        return self._tracer.span(name, **args)
+
+    def _send_raw(self, string):
+        if self._print_io:
+            print(color.text('magenta') + 'TO SERVER --> ' + str(
+                string) + color.reset())
+        self.socket.sendall(string)
+
+    # encodes an event to send to the server
+    def _encode(self, event, data):
+        return (json.dumps({
+            'sentTime': int(time.time()),
+            'event': event,
+            'data': serialize(data)
+        }) + EOT_CHAR).encode('utf-8')
 
-# Client: A singleton module that talks to the server receiving game
-# information and sending commands to execute. Clients perform no game logic
-class _Client:
-    socket = None
+    # sends the server an event via socket
+    def send(self, event, data):
+        self._send_raw(self._encode(event, data))
+
+    # increments one of the client's instrumentation counters
+    def count(self, name, amount=1):
+        value = self._counters.get(name, 0) + amount
+        self._counters[name] = value
+        if self._tracer:
+            self._tracer.counter(name, value)
+
+    def get_counters(self):
+        """Gets a copy of the instrumentation counters the client has kept
+        while playing, such as how many game_updated calls were skipped
+        because deltas were coalesced.
+
+        Returns:
+            dict[str, int]: the counter values keyed by their name
+        """
+        return dict(self._counters)
+
+    def disconnect(self, exit_code=None):
+        if self.socket:
+            self.socket.close()
+
+    # ends this client's session, which for the process wide client ends the process
+    def exit(self, exit_code):
+        if self._profiler:
+            self._profiler.stop()
+        if self._tracer:
+            self._tracer.write()
+        if self is _client:
+            os._exit(exit_code)
+        raise SessionEnded(exit_code)
+
+    def run_on_server(self, caller, function_name, args=None):
+        if function_name == 'log' and self._log_buffer is not None:
+            dropped = self._log_buffer.add(caller, args['message'])
+            self.count('logs_dropped_' + dropped if dropped else 'logs_queued')
+            return None
+        if self._batch is not None:
+            return self._batch.add(caller, function_name, args)
+
+        with client_code(), self._span('run ' + function_name, caller=caller.id):
+            self.send('run', {
+                'caller': caller,
+                'functionName': function_name,
+                'args': args
+            })
+
+            ran_data = self.wait_for_event('ran')
+            return deserialize(ran_data, self.game)
+
+    def run_on_server_pipelined(self, calls):
+        """Runs functions on the server back-to-back, sending every call
+        before waiting for any of them to return, so all of them together
+        cost about one round trip.
+
+        Args:
+            calls (list[tuple]): (caller, function name, args) of each call.
+
+        Returns:
+            list: what each call returned, in the same order
+        """
+        if not calls:
+            return []
+
+        with client_code(), self._span('run pipelined', calls=len(calls)):
+            self._send_raw(b''.join(
+                self._encode('run', {
+                    'caller': caller,
+                    'functionName': function_name,
+                    'args': args
+                }) for caller, function_name, args in calls
+            ))
+
+            ran = [self.wait_for_event('ran') for call in calls]
+            return [deserialize(data, self.game) for data in ran]
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Context manager batching the commands run inside it, which
+        return Deferred results and are sent to the server back-to-back
+        once it exits. Batches inside of a batch join it. If the block
+        raises, the commands not sent yet are dropped instead.
+
+        Yields:
+            Batch: the batch of commands
+        """
+        if self._batch is not None:
+            yield self._batch
+            return
+
+        self._batch = batch = Batch(self)
+        try:
+            yield batch
+        except BaseException:
+            self._batch = None
+            batch.discard()
+            raise
+        self._batch = None
+        batch.flush()
+
+    # sends the logs queued this turn, or drops them if the turn is short on time
+    def _flush_logs(self):
+        queued = len(self._log_buffer)
+        if not queued:
+            return
+        logs = self._log_buffer.take(self.ai.turn_budget)
+        if len(logs) < queued:
+            self.count('logs_dropped_late', queued - len(logs))
+        with self.phase('network'):
+            self.run_on_server_pipelined(logs)
+        self.count('logs_sent', len(logs))
+
+    def play(self):
+        self.wait_for_event(None)
+
+    def wait_for_event(self, event):
+        while True:
+            self.wait_for_events()
+
+            while len(self._events_stack) > 0:
+                sent = self._events_stack.pop()
+                data = sent['data'] if 'data' in sent else None
+                if event is not None and sent['event'] == event:
+                    return data
+                else:
+                    self._auto_handle(sent['event'], data)
+
+    # loops to check the socket for incoming data and ends once some events
+    # get found
+    def wait_for_events(self):
+        if len(self._events_stack) > 0:
+            return  # as we already have events to handle, no need to wait for more
+
+        try:
+            while True:
+                sent = None
+                try:
+                    with self.phase('network'), self._span('recv'):
+                        sent = self.socket.recv(self._buffer_size) \
+                            .decode('utf-8')
+                except socket.timeout:
+                    pass  # timed out so keyboard/system interrupts can be handled,
+                    #       hence the while true loop above
+                except socket.error as e:
+                    error_code.handle_error(
+                        error_code.CANNOT_READ_SOCKET, e,
+                        'Error reading socket while waiting for events')
+
+                if sent is None:
+                    continue
+                elif not sent:
+                    error_code.handle_error(
+                        error_code.DISCONNECTED_UNEXPECTEDLY,
+                        message='The server closed the connection')
+                elif self._print_io:
+                    print(color.text('magenta') + 'FROM SERVER <-- ' + str(
+                        sent) + color.reset())
+
+                with self._span('parse frames'):
+                    split = (self._received_buffer + sent).split(EOT_CHAR)
+                    # the last item will either be "" if the last char was an EOT_CHAR,
+                    #   or a partial data we need to buffer anyways
+                    self._received_buffer = split.pop()
+
+                    for json_str in reversed(split):
+                        try:
+                            parsed = json.loads(json_str)
+                        except ValueError as e:
+                            error_code.handle_error(error_code.MALFORMED_JSON, e,
+                                                    'Could not parse json ""'.format(
+                                                        json_str)
+                                                    )
+
+                        self._events_stack.append(parsed)
+
+                if len(self._events_stack) > 0:
+                    return
+        except (KeyboardInterrupt, SystemExit):
+            self.disconnect()
+
+    # called via the client run loop when data is sent
+    def _auto_handle(self, event, data=None):
+        auto_handle_function = getattr(self, '_auto_handle_' + event, None)
+
+        if auto_handle_function:
+            return auto_handle_function(data)
+        else:
+            error_code.handle_error(error_code.UNKNOWN_EVENT_FROM_SERVER, message=(
+                'Could not auto handle event "{}".'.format(event)))
+
+    def _auto_handle_delta(self, data):
+        try:
+            with self.phase('merge'), self._span('merge'):
+                self.manager.apply_delta_state(data)
+
+                # coalesce back-to-back deltas so the AI is only notified once
+                while len(self._events_stack) > 0 and \
+                        self._events_stack[-1]['event'] == 'delta':
+                    sent = self._events_stack.pop()
+                    self.manager.apply_delta_state(sent['data'])
+                    self.count('game_updated_skipped')
+        except:
+            error_code.handle_error(error_code.DELTA_MERGE_FAILURE, sys.exc_info(),
+                                    'Error merging delta')
+
+        if self.ai.player:  # then the AI is ready for updates
+            with self.phase('ai'), self._span('game_updated'):
+                self.ai.game_updated()
+
+    def _auto_handle_order(self, data):
+        self.ai._stop_pondering()
+
+        args = deserialize(data['args'], self.game)
+        self.ai._start_turn()
+        try:
+            with self.phase('ai'), self._span(data['name'], order=data['index']):
+                returned = self.ai._do_order(data['name'], args)
+        except:
+            print('esc info', type(sys.exc_info()))
+            error_code.handle_error(error_code.AI_ERRORED, sys.exc_info(),
+                                    'AI errored executing order "{}"'.format(
+                                        data.name))
+
+        if self._log_buffer is not None:
+            self._flush_logs()
+
+        with self._span('send finished'):
+            self.send("finished", {
+                'orderIndex': data['index'],
+                'returned': returned
+            })
+        self.ai._finish_turn()
+        if self._profiler:
+            self._profiler.end_turn()
+
+        self.ai._start_pondering()
+
+    def _auto_handle_invalid(self, data):
+        try:
+            self.ai.invalid(data['message'])
+        except:
+            error_code.handle_error(error_code.AI_ERRORED, sys.exc_info(),
+                                    'AI errored while handling invalid data.')
+
+    def _auto_handle_fatal(self, data):
+        error_code.handle_error(
+            error_code.FATAL_EVENT,
+            message='Got a fatal event from the server: ' + data['message']
+        )
 
-_client = _Client()
+    def _auto_handle_over(self, data):
+        won = self.ai.player.won
+        reason = self.ai.player.reason_won \
+            if self.ai.player.won \
+            else self.ai.player.reason_lost
+
+        print('{}Game is Over. {} because {}{}'.format(
+            color.text('green'),
+            'I Won!' if won else 'I Lost :(',
+            reason,
+            color.reset()
+        ))
+
+        try:
+            self.ai._stop_pondering()
+            with self.phase('ai'):
+                self.ai.end(won, reason)
+            self.ai._release_resources()
+        except:
+            error_code.handle_error(error_code.AI_ERRORED, sys.exc_info(),
+                                    'AI errored during end.')
+
+        skipped = self._counters.get('game_updated_skipped', 0)
+        if skipped:
+            print(color.text('cyan') + 'Skipped {} game_updated calls by merging back-to-back deltas'.format(
+                skipped) + color.reset())
+
+        if self._log_buffer is not None:
+            unsent = len(self._log_buffer.take())
+            if unsent:
+                self.count('logs_dropped_over', unsent)
+            dropped = sum(v for k, v in self._counters.items() if k.startswith('logs_dropped_'))
+            if dropped:
+                print(color.text('yellow') + 'Dropped {} of the AI\'s logs: {}'.format(dropped, ', '.join(
+                    '{} {}'.format(v, k[len('logs_dropped_'):]) for k, v in sorted(self._counters.items())
+                    if k.startswith('logs_dropped_')
+                )) + color.reset())
+
+        if 'message' in data:
+            hostname = 'localhost' if self.hostname.startswith(UNIX_PREFIX) else self.hostname
+            message = data['message'].replace('__HOSTNAME__', hostname)
+            print(color.text('cyan') + message + color.reset())
+
+        self.disconnect()
+        self.exit(0)
+
+
+# the process wide client, used unless a thread was given its own
+_client = Client()
+_thread_clients = threading.local()
+
+
+def current():
+    """Gets the Client playing on the current thread.
+
+    Returns:
+        Client: the current thread's Client, or the process wide one
+    """
+    return getattr(_thread_clients, 'client', _client)
+
+
+def set_current(client):
+    """Sets the Client that plays on the current thread, so multiple game
+    sessions can be played at once, each on its own thread.
+
+    Args:
+        client (Client): The client for this thread.
+    """
+    _thread_clients.client = client
 
 
 def connect(hostname='localhost', port=3000, print_io=False):
-    _client.hostname = hostname
-    _client.port = int(port)
+    current().connect(hostname, port, print_io)
 
-    _client._print_io = print_io
-    _client._received_buffer = ""
-    _client._events_stack = []
-    _client._buffer_size = 1024
-    _client._timeout_time = 1.0
 
-    print(color.text('cyan') + 'Connecting to:', _client.hostname + ':' + str(
-        _client.port) + color.reset())
+def setup(game, ai, manager):
+    current().setup(game, ai, manager)
 
-    try:
-        _client.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-        # Silly Windows
-        _client.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+def set_profiler(profiler):
+    current().set_profiler(profiler)
 
-        # so the blocking on recv doesn't hang forever and other system
-        # interrupts (e.g. keyboard) can be handled
-        _client.socket.settimeout(_client._timeout_time)
-        _client.socket.connect((_client.hostname, _client.port))
-    except socket.error as e:
-        error_code.handle_error(
-            error_code.COULD_NOT_CONNECT,
-            e,
-            'Could not connect to {}:{}'.format(
-                _client.hostname,
-                _client.port
-            )
-        )
 
+def set_tracer(tracer):
+    current().set_tracer(tracer)
 
-def setup(game, ai, manager):
-    _client.game = game
-    _client.ai = ai
-    _client.manager = manager
+
+def phase(name):
+    return current().phase(name)
 
 
-def _send_raw(string):
-    if _client._print_io:
-        print(color.text('magenta') + 'TO SERVER --> ' + str(
-            string) + color.reset())
-    _client.socket.send(string)
+def set_log_buffer(log_buffer):
+    current().set_log_buffer(log_buffer)
 
 
 # sends the server an event via socket
 def send(event, data):
-    _send_raw(
-        (json.dumps({
-            'sentTime': int(time.time()),
-            'event': event,
-            'data': serialize(data)
-        }) + EOT_CHAR).encode('utf-8')
-    )
+    current().send(event, data)
+
+
+# increments one of the client's instrumentation counters
+def count(name, amount=1):
+    current().count(name, amount)
+
+
+def get_counters():
+    """Gets a copy of the instrumentation counters the current client has
+    kept while playing, such as how many game_updated calls were skipped
+    because deltas were coalesced.
+
+    Returns:
+        dict[str, int]: the counter values keyed by their name
+    """
+    return current().get_counters()
 
 
 def disconnect(exit_code=None):
-    if _client.socket:
-        _client.socket.close()
+    current().disconnect(exit_code)
 
 
 def run_on_server(caller, function_name, args=None):
-    send('run', {
-        'caller': caller,
-        'functionName': function_name,
-        'args': args
-    })
+    return current().run_on_server(caller, function_name, args)
+
+
+def run_on_server_pipelined(calls):
+    return current().run_on_server_pipelined(calls)
+
 
-    ran_data = wait_for_event('ran')
-    return deserialize(ran_data, _client.game)
+def batch():
+    return current().batch()
 
 
 def play():
-    wait_for_event(None)
+    current().play()
 
 
 def wait_for_event(event):
-    while True:
-        wait_for_events()
-
-        while len(_client._events_stack) > 0:
-            sent = _client._events_stack.pop()
-            data = sent['data'] if 'data' in sent else None
-            if event is not None and sent['event'] == event:
-                return data
-            else:
-                _auto_handle(sent['event'], data)
+    return current().wait_for_event(event)
 
 
-# loops to check the socket for incoming data and ends once some events
-# get found
 def wait_for_events():
-    if len(_client._events_stack) > 0:
-        return  # as we already have events to handle, no need to wait for more
-
-    try:
-        while True:
-            sent = None
-            try:
-                sent = _client.socket.recv(_client._buffer_size) \
-                    .decode('utf-8')
-            except socket.timeout:
-                pass  # timed out so keyboard/system interrupts can be handled,
-                #       hence the while true loop above
-            except socket.error as e:
-                error_code.handle_error(
-                    error_code.CANNOT_READ_SOCKET, e,
-                    'Error reading socket while waiting for events')
-
-            if not sent:
-                continue
-            elif _client._print_io:
-                print(color.text('magenta') + 'FROM SERVER <-- ' + str(
-                    sent) + color.reset())
-
-            split = (_client._received_buffer + sent).split(EOT_CHAR)
-            # the last item will either be "" if the last char was an EOT_CHAR,
-            #   or a partial data we need to buffer anyways
-            _client._received_buffer = split.pop()
-
-            for json_str in reversed(split):
-                try:
-                    parsed = json.loads(json_str)
-                except ValueError as e:
-                    error_code.handle_error(error_code.MALFORMED_JSON, e,
-                                            'Could not parse json ""'.format(
-                                                json_str)
-                                            )
-
-                _client._events_stack.append(parsed)
-
-            if len(_client._events_stack) > 0:
-                return
-    except (KeyboardInterrupt, SystemExit):
-        disconnect()
-
-
-# called via the client run loop when data is sent
-def _auto_handle(event, data=None):
-    # the current module, e.g. the Client module that acts as a singleton
-    g = globals()
-    auto_handle_function = g['_auto_handle_' + event]
-
-    if auto_handle_function:
-        return auto_handle_function(data)
-    else:
-        error_code.handle_error(error_code.UNKNOWN_EVENT_FROM_SERVER, message=(
-            'Could not auto handle event "{}".'.format(event)))
-
-
-def _auto_handle_delta(data):
-    try:
-        _client.manager.apply_delta_state(data)
-    except:
-        error_code.handle_error(error_code.DELTA_MERGE_FAILURE, sys.exc_info(),
-                                'Error merging delta')
-
-    if _client.ai.player:  # then the AI is ready for updates
-        _client.ai.game_updated()
-
-
-def _auto_handle_order(data):
-    args = deserialize(data['args'], _client.game)
-    try:
-        returned = _client.ai._do_order(data['name'], args)
-    except:
-        print('esc info', type(sys.exc_info()))
-        error_code.handle_error(error_code.AI_ERRORED, sys.exc_info(),
-                                'AI errored executing order "{}"'.format(
-                                    data.name))
-
-    send("finished", {
-        'orderIndex': data['index'],
-        'returned': returned
-    })
-
-
-def _auto_handle_invalid(data):
-    try:
-        _client.ai.invalid(data['message'])
-    except:
-        error_code.handle_error(error_code.AI_ERRORED, sys.exc_info(),
-                                'AI errored while handling invalid data.')
-
-
-def _auto_handle_fatal(data):
-    error_code.handle_error(
-        error_code.FATAL_EVENT,
-        message='Got a fatal event from the server: ' + data['message']
-    )
-
-
-def _auto_handle_over(data):
-    won = _client.ai.player.won
-    reason = _client.ai.player.reason_won \
-        if _client.ai.player.won \
-        else _client.ai.player.reason_lost
-
-    print('{}Game is Over. {} because {}{}'.format(
-        color.text('green'),
-        'I Won!' if won else 'I Lost :(',
-        reason,
-        color.reset()
-    ))
-
-    try:
-        _client.ai.end(won, reason)
-    except:
-        error_code.handle_error(error_code.AI_ERRORED, sys.exc_info(),
-                                'AI errored during end.')
-
-    if 'message' in data:
-        message = data['message'].replace('__HOSTNAME__', _client.hostname)
-        print(color.text('cyan') + message + color.reset())
-
-    disconnect()
-    os._exit(0)
+    current().wait_for_events()
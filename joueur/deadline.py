@@ -0,0 +1,200 @@
+# Deadline: per turn time budgets computed from the time the server gives us
+import contextlib
+import math
+import signal
+import threading
+import time
+import joueur.ansi_color_coder as color
+
+_NS_PER_SECOND = 1e9
+
+# how deep the current thread is in the client's own code, see client_code
+_client_code = threading.local()
+
+# if we already warned that hard limits cannot interrupt code here
+_warned_no_alarm = False
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a turn's time budget has been used up."""
+    pass
+
+
+# @class TurnBudget: how much time the AI may spend on the current turn
+class TurnBudget():
+    def __init__(self, seconds):
+        self._seconds = max(0.0, seconds)
+        self._started = time.monotonic()
+
+    @property
+    def seconds(self):
+        """The total number of seconds budgeted for this turn.
+
+        :rtype: float
+        """
+        return self._seconds
+
+    def elapsed(self):
+        """Gets how many seconds of this turn have been used so far.
+
+        Returns:
+            float: the elapsed seconds
+        """
+        return time.monotonic() - self._started
+
+    def remaining(self):
+        """Gets how many seconds are left in this turn's budget.
+
+        Returns:
+            float: the remaining seconds, never negative
+        """
+        return max(0.0, self._seconds - self.elapsed())
+
+    def ok(self, fraction=1.0):
+        """Checks if there is still time left, intended for anytime searches
+        e.g. `while budget.ok(): deepen()`.
+
+        Args:
+            fraction (float): Only use this fraction of the budget, e.g. 0.5
+                to stop deepening once half of the budget is used, as the
+                next iteration will probably take longer than all before it.
+
+        Returns:
+            bool: True if there is still time left, False otherwise
+        """
+        return self.elapsed() < self._seconds * fraction
+
+    def check(self):
+        """Raises DeadlineExceeded if there is no time left, for checking
+        deep inside recursive searches.
+        """
+        if not self.ok():
+            raise DeadlineExceeded()
+
+    @contextlib.contextmanager
+    def hard_limit(self):
+        """Context manager that aborts the code inside it once the budget is
+        used up, even if it never checks the budget itself. The aborted code
+        is simply exited, so keep your best result so far outside of it.
+        Hard limits use SIGALRM, so only work on the main thread of Unix
+        systems. Elsewhere, e.g. in `--sessions` sessions or while pondering,
+        nothing interrupts the code, which runs to completion however long
+        it takes, so it must check the budget itself. A warning is printed
+        the first time that happens.
+        """
+        can_alarm = hasattr(signal, 'setitimer') and \
+            threading.current_thread() is threading.main_thread()
+
+        if not can_alarm:
+            _warn_no_alarm()
+        else:
+            def on_alarm(signum, frame):
+                if getattr(_client_code, 'depth', 0):
+                    _client_code.alarmed = True # raised once the client returns to the AI's code
+                else:
+                    raise DeadlineExceeded()
+
+            previous = signal.signal(signal.SIGALRM, on_alarm)
+            signal.setitimer(signal.ITIMER_REAL, max(self.remaining(), 1e-6))
+
+        try:
+            yield self
+        except DeadlineExceeded:
+            pass
+        finally:
+            if can_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+                _client_code.alarmed = False
+
+
+def _warn_no_alarm():
+    global _warned_no_alarm
+    if not _warned_no_alarm:
+        _warned_no_alarm = True
+        print(color.text('yellow') + 'Hard limits cannot interrupt code off the main thread, '
+            'so the code in them runs to completion, check the turn budget in it instead.' + color.reset())
+
+
+@contextlib.contextmanager
+def client_code():
+    """Context manager the client runs its own code in while the AI waits on
+    it, e.g. run_on_server. If a hard limit runs out meanwhile the client is
+    not interrupted half way through reading a reply or merging a delta,
+    instead DeadlineExceeded is raised once it returns to the AI's code.
+    """
+    depth = getattr(_client_code, 'depth', 0)
+    _client_code.depth = depth + 1
+    try:
+        yield
+    finally:
+        _client_code.depth = depth
+        alarmed = depth == 0 and getattr(_client_code, 'alarmed', False)
+        if alarmed:
+            _client_code.alarmed = False
+
+    if alarmed:
+        raise DeadlineExceeded()
+
+
+# @class DeadlineManager: computes turn budgets from the player's remaining time, the expected number of turns left, and the measured network overhead
+class DeadlineManager():
+    def __init__(self, safety=0.8, reserve=0.05, default_turns_left=40):
+        self._safety = safety
+        self._reserve = reserve
+        self._default_turns_left = default_turns_left
+        self._overhead = 0.0
+        self._last_remaining = None
+        self._last_duration = None
+        self._turn_started = None
+
+    @property
+    def overhead(self):
+        """The estimated seconds the server charges us per turn beyond the
+        time we measured ourselves, e.g. network latency.
+
+        :rtype: float
+        """
+        return self._overhead
+
+    def start_turn(self, game, player):
+        """Computes the budget for the turn that is starting.
+
+        Args:
+            game (BaseGame): The game being played.
+            player (BaseGameObject): The Player the AI controls.
+
+        Returns:
+            TurnBudget: the time budget for this turn
+        """
+        remaining = player.time_remaining / _NS_PER_SECOND
+        added = getattr(game, 'time_added_per_turn', 0) / _NS_PER_SECOND
+
+        if self._last_remaining is not None:
+            charged = self._last_remaining + added - remaining
+            sample = max(0.0, charged - self._last_duration)
+            self._overhead = 0.75 * self._overhead + 0.25 * sample
+
+        turns_left = self._default_turns_left
+        max_turns = getattr(game, 'max_turns', None)
+        if max_turns:
+            players = max(1, len(game.players))
+            turns_left = math.ceil((max_turns - game.current_turn) / players)
+        turns_left = max(1, turns_left)
+
+        # time is added after each of our turns, so all but the last count
+        total = remaining + added * (turns_left - 1)
+        seconds = (total / turns_left - self._overhead) * self._safety
+        seconds = min(seconds, remaining - self._overhead - self._reserve)
+
+        self._last_remaining = remaining
+        self._turn_started = time.monotonic()
+        return TurnBudget(seconds)
+
+    def finish_turn(self):
+        """Records that the current turn finished, so the next turn can
+        measure the network overhead.
+        """
+        if self._turn_started is not None:
+            self._last_duration = time.monotonic() - self._turn_started
+            self._turn_started = None
@@ -1,8 +1,23 @@
+import threading
+
+# held while merging the pending deltas of a cold field, as background threads may read it at the same time
+_materialize_lock = threading.Lock()
+
+
 class DeltaMergeable():
     """a game or game object that needs to be delta merged"""
 
     def __init__(self):
-        pass
+        self._version = 0
+
+    @property
+    def version(self):
+        """A counter that increases every time the server changes this game
+        or game object. The game's version increases on every delta merged.
+
+        :rtype: int
+        """
+        return self._version
 
     def _run_on_server(self, function_name, **kwargs):
         import joueur.client # avoid circular imports (sphinx won't build docs otherwise)
@@ -13,3 +28,37 @@ class DeltaMergeable():
 
     def __getitem__(self, key):
         return getattr(self, key)
+
+    def __delitem__(self, key):
+        # the properties must stay readable, so removed values just become None
+        setattr(self, key, None)
+
+    def __getattr__(self, name):
+        # only called for attributes that are not set, which cold fields are
+        # until read, as their deltas are pending
+        pending = self.__dict__.get('_cold')
+        if not pending or name not in pending:
+            raise AttributeError("'{}' object has no attribute '{}'".format(
+                type(self).__name__, name))
+        self._materialize(name)
+        return self.__dict__[name]
+
+    # merges the deltas pending for a cold field, setting it
+    def _materialize(self, name):
+        with _materialize_lock:
+            if name not in self._cold:
+                return # another thread just materialized it
+            manager, value, fragments = self._cold[name]
+            holder = {name: value}
+            for fragment in fragments:
+                manager._merge_delta(holder, {name: fragment})
+            value = holder.get(name) # removed values become None, as in __delitem__
+            if type(value) is str:
+                value = manager._intern_field(self, name, value)
+            self.__dict__[name] = value
+            del self._cold[name]
+
+    # merges the deltas pending for every cold field, e.g. before being copied
+    def _materialize_cold(self):
+        for name in list(self.__dict__.get('_cold', ())):
+            self._materialize(name)
@@ -0,0 +1,84 @@
+# DoubleBufferedGame: read consistent copies of the game for background threads
+import contextlib
+import copy
+import threading
+from joueur.game_manager import GameManager
+
+
+# @class DoubleBufferedGame: two forks of the game, the front one is read by
+# background threads while the client merges new deltas into the back one,
+# after which they are swapped, publishing a new epoch
+class DoubleBufferedGame():
+    def __init__(self, manager):
+        self._condition = threading.Condition()
+        self._epoch = 0
+        self._front = 0
+        self._buffers = [self._fork(manager), self._fork(manager)]
+        self._readers = [0, 0]
+        self._pending = [[], []]
+        self._publish_listeners = []
+
+        manager.add_merge_listener(self._delta_merged)
+
+    def _fork(self, manager):
+        fork_manager = GameManager(manager.game.fork())
+        fork_manager.set_constants(manager._server_constants)
+        return fork_manager
+
+    @property
+    def epoch(self):
+        """The number of deltas published to readers so far.
+
+        :rtype: int
+        """
+        return self._epoch
+
+    @contextlib.contextmanager
+    def read(self):
+        """Context manager yielding a copy of the game that will not change
+        while it is held, even as the client merges new deltas. Intended for
+        background threads, e.g. `with buffered.read() as game: ...`. Do not
+        hold onto it for longer than needed, as the client waits for the
+        readers of the previous epoch before it can merge the next delta.
+
+        Yields:
+            BaseGame: the read consistent copy of the game
+        """
+        with self._condition:
+            index = self._front
+            self._readers[index] += 1
+            game = self._buffers[index].game
+
+        try:
+            yield game
+        finally:
+            with self._condition:
+                self._readers[index] -= 1
+                self._condition.notify_all()
+
+    ## registers a callback invoked with the new epoch once it is published, i.e. readers get the game with the delta merged
+    def add_publish_listener(self, callback):
+        self._publish_listeners.append(callback)
+
+    ## invoked on the client's thread after every delta merged into the real game
+    def _delta_merged(self, delta):
+        # only the client's thread ever swaps the buffers, so this is stable
+        back = 1 - self._front
+        self._pending[back].append(delta)
+        self._pending[self._front].append(copy.deepcopy(delta))
+
+        with self._condition:
+            while self._readers[back] > 0:
+                self._condition.wait()
+
+        # readers are only ever handed the front buffer, so this is safe
+        for pending in self._pending[back]:
+            self._buffers[back].apply_delta_state(pending)
+        del self._pending[back][:]
+
+        with self._condition:
+            self._front = back
+            self._epoch += 1
+
+        for callback in self._publish_listeners:
+            callback(self._epoch)
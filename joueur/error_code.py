@@ -21,16 +21,17 @@ for key, value in dict(locals()).items():
 
 # now import so they don't get put in _by_code
 
-import traceback
 import sys
 import joueur.ansi_color_coder as color
-import os
 
 def handle_error(error_code, e=None, message=None):
     if isinstance(e, SystemExit) or isinstance(e, KeyboardInterrupt): # we accidentally caught an exit exception, just re-throw it till it gets to the end of the runtime stack
         sys.exit(e.code)
 
     import joueur.client # avoid circular imports (sphinx won't build docs otherwise)
+    if isinstance(sys.exc_info()[1], joueur.client.SessionEnded): # the session already ended, keep unwinding its thread
+        raise sys.exc_info()[1]
+
     joueur.client.disconnect()
 
     sys.stderr.write(color.text("red") + "---\nError: {}\n---".format(_by_code[error_code] if error_code in _by_code else "UNKNOWN ERROR {}".format(error_code)))
@@ -41,9 +42,10 @@ def handle_error(error_code, e=None, message=None):
     if e:
         sys.stderr.write("\n{}\n---\n".format(str(e)))
 
+        import traceback # only needed once erroring, and slow to import
         traceback.print_exc()
 
         sys.stderr.write("---")
 
     sys.stderr.write("\n" + color.reset())
-    os._exit(error_code)
+    joueur.client.current().exit(error_code)
@@ -1,32 +1,169 @@
+import copy
+from sys import intern
+from joueur.class_metadata import string_choices
 from joueur.delta_mergeable import DeltaMergeable
 from joueur.base_game_object import BaseGameObject
-from joueur.utilities import camel_case_converter
+from joueur.utilities import camel_case_converter, lower_camel_case
 from joueur.serializer import is_game_object_reference, is_object
+import joueur.state_hash as state_hash
+
+# the string fields every game object has with few distinct values, so always interned
+_INTERNED_FIELDS = frozenset(['_game_object_name'])
+
+# @class _AttributeNames: the attribute names of keys in deltas, converted once per key as that is slow
+class _AttributeNames(dict):
+    def __missing__(self, key):
+        name = self[key] = "_" + camel_case_converter(key)
+        return name
+
 
 # @class GameManager: managed the game and it's game objects including unserializing deltas
 class GameManager():
-    def __init__(self, game):
+    def __init__(self, game, cold_fields=None):
         self.game = game
         self._game_object_classes = game._game_object_classes
+        self._merge_listeners = []
+        self._attribute_names = _AttributeNames()
+        if cold_fields is not None:
+            self.set_cold_fields(cold_fields)
+
+    ## sets the fields of this game merged lazily, by class name, e.g. {'Tile': ['decoration']}. Their deltas are kept as is until the AI first reads the field, and they are left out of the state hash. Forks of the game keep them
+    def set_cold_fields(self, cold_fields):
+        objects = [self.game] + list(self.game._game_objects.values())
+        for obj in objects:
+            obj._materialize_cold()
+
+        cold = {}
+        cold_keys = {}
+        for cls in [type(self.game)] + list(self._game_object_classes.values()):
+            names = set()
+            for base in cls.__mro__:
+                for field in cold_fields.get(base.__name__, ()):
+                    if base is cls and "_" + field not in state_hash.fields_of(cls):
+                        raise ValueError('{} has no field "{}" to make cold'.format(cls.__name__, field))
+                    names.add("_" + field)
+            if names:
+                cold[cls] = frozenset(names)
+                cold_keys[cls] = {lower_camel_case(name[1:]): name for name in names}
+
+        self.game._cold_fields = cold
+        self.game._cold_keys = cold_keys
+
+        self.game._state_hash = None # re-hashed without the cold fields once read
 
     def set_constants(self, constants):
         self._server_constants = constants
         self._DELTA_REMOVED = constants['DELTA_REMOVED']
         self._DELTA_LIST_LENGTH = constants['DELTA_LIST_LENGTH']
 
+    ## registers a callback invoked with a pristine copy of every delta after it has been merged
+    def add_merge_listener(self, callback):
+        self._merge_listeners.append(callback)
+
     ## applies a delta state (change in state information) to this game
     def apply_delta_state(self, delta):
+        original = copy.deepcopy(delta) if self._merge_listeners else None
+
+        changed_ids = []
+        new_ids = set()
         if 'gameObjects' in delta:
+            changed_ids = list(delta['gameObjects'])
+            new_ids = set(id for id in changed_ids if id not in self.game._game_objects)
             self._init_game_objects(delta['gameObjects'])
 
-        self._merge_delta(self.game, delta)
+        if self.game._state_hash is None: # the AI never read the hash, so don't maintain it
+            self._merge_delta(self.game, delta)
+        else:
+            changed_fields = self._changed_fields(delta, new_ids)
+            self._hash_fields(changed_fields) # hash out the old values
+
+            self._merge_delta(self.game, delta)
+
+            self._hash_fields(changed_fields) # and hash in the new ones
+            for id in new_ids:
+                if id in self.game._game_objects:
+                    self.game._state_hash ^= self._object_key(id, self.game._game_objects[id])
+        self._bump_versions(changed_ids)
+
+        for callback in self._merge_listeners:
+            callback(original)
+
+    ## finds the (owner id, owner, attribute name) of every top level field this delta will change, the game's own fields have no owner id
+    def _changed_fields(self, delta, new_ids):
+        changed = []
+        for key in delta:
+            if key != 'gameObjects':
+                changed.append((None, self.game, self._attribute_names[key]))
+
+        for id, obj_delta in delta.get('gameObjects', {}).items():
+            if id in new_ids or id not in self.game._game_objects:
+                continue # new game objects are hashed in whole once merged
+            game_object = self.game._game_objects[id]
+            if obj_delta == self._DELTA_REMOVED:
+                self.game._state_hash ^= self._object_key(id, game_object)
+            else:
+                for key in obj_delta:
+                    if key != self._DELTA_LIST_LENGTH:
+                        changed.append((id, game_object, self._attribute_names[key]))
+
+        return changed
+
+    ## the key of every field of a game object in the state hash, besides its cold fields
+    def _object_key(self, id, game_object):
+        return state_hash.object_key(id, game_object, self.game._cold_fields.get(type(game_object), frozenset()))
+
+    ## XORs the current values of the given fields into the game's state hash
+    def _hash_fields(self, fields):
+        cold_fields = self.game._cold_fields
+        for owner_id, owner, name in fields:
+            if name in state_hash.fields_of(type(owner)) and name not in cold_fields.get(type(owner), ()):
+                self.game._state_hash ^= state_hash.field_key(owner_id, name, getattr(owner, name, None))
+
+    ## bumps the version counters of the game and every game object this delta touched, so state based caches know they are stale
+    def _bump_versions(self, changed_ids):
+        self.game._version += 1
+        for id in changed_ids:
+            if id in self.game._game_objects:
+                self.game._game_objects[id]._version += 1
 
     ## game objects can be refences in the delta states for cycles, they will all point to the game objects here.
     def _init_game_objects(self, delta_game_objects):
         for id, obj in delta_game_objects.items():
-            if not id in self.game._game_objects: # then we need to create it
+            if not id in self.game._game_objects and obj != self._DELTA_REMOVED: # then we need to create it
                 self.game._game_objects[id] = self._game_object_classes[obj['gameObjectName']]()
 
+    ## drops a game object the server removed from the game, and tombstones it so stale references held by the AI can tell it is gone
+    def _remove_game_object(self, id):
+        game_object = self.game._game_objects.pop(id, None)
+        if game_object is not None:
+            game_object._removed = True
+            game_object._version += 1
+
+    ## interns the strings the game's classes document the values of, e.g. a Tile's type, so they are stored once and the AI can compare them by identity
+    def _intern_field(self, owner, name, value):
+        if name in _INTERNED_FIELDS:
+            return intern(value)
+        choices = string_choices(type(owner)).get(name)
+        return choices.get(value, value) if choices else value
+
+    ## keeps the delta of a cold field to merge once it is read, only references and values replacing the whole field are applied right away
+    def _defer_cold(self, state, state_key, d):
+        pending = state.__dict__.get('_cold')
+        if pending is None:
+            pending = state._cold = {}
+
+        if state_key in pending and is_object(d) and not is_game_object_reference(d):
+            pending[state_key][2].append(d)
+            return
+
+        value = state.__dict__.pop(state_key, None) # so reading it falls back to __getattr__
+        if not is_object(d):
+            pending[state_key] = (self, None if d == self._DELTA_REMOVED else d, [])
+        elif is_game_object_reference(d):
+            pending[state_key] = (self, self.game.get_game_object(d['id']), [])
+        else:
+            pending[state_key] = (self, value, [d])
+
     ## Correctly apply a single change to a member of a list, dict, or object
     def _set_member(self, state, state_key, value):
         if isinstance(state_key, int) or isinstance(state, dict):
@@ -47,6 +184,7 @@ class GameManager():
             while len(state) < delta_length: # append elements on the array to make it's size correct.
                 state.append(None)
 
+        cold_keys = self.game._cold_keys.get(type(state)) # only ever set for games and game objects
         for key in delta: # deltas will always be objects when iterating through, arrays just have keys of numbers
             d = delta[key]
             state_key = key # array's keys are real numbers, not strings e.g. "1"
@@ -57,12 +195,18 @@ class GameManager():
                 key_in_state = state_key < len(state)
             else:
                 if isinstance(state, DeltaMergeable):
-                    state_key = "_" + camel_case_converter(state_key)
+                    if cold_keys and key in cold_keys:
+                        self._defer_cold(state, cold_keys[key], d)
+                        continue
+                    state_key = self._attribute_names[key]
                 key_in_state = state_key in state
 
             if d == self._DELTA_REMOVED:
                 if key_in_state:
-                    del state[state_key]
+                    if state is self.game._game_objects:
+                        self._remove_game_object(state_key)
+                    else:
+                        del state[state_key]
             elif is_game_object_reference(d): # then this is a shallow reference to a game object
                 referenced_object = self.game.get_game_object(d['id'])
                 self._set_member(state, state_key, referenced_object)
@@ -73,4 +217,6 @@ class GameManager():
                     self._set_member(state, state_key, [] if self._DELTA_LIST_LENGTH in d else {})
                     self._merge_delta(state[state_key], d)
             else:
+                if type(d) is str and isinstance(state, DeltaMergeable):
+                    d = self._intern_field(state, state_key, d)
                 self._set_member(state, state_key, d)
@@ -0,0 +1,81 @@
+# Import profile: audits how long the client takes to start, by importing the
+# client, the game and its AI (with all of the AI's own imports) in a fresh
+# interpreter with `-X importtime`, then reporting the slowest imports.
+import os
+import re
+import subprocess
+import sys
+import time
+from joueur.utilities import camel_case_converter
+import joueur.ansi_color_coder as color
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+_STARTUP = (
+    'import joueur.run, joueur.client\n'
+    'import games.{0} as game_module\n'
+    'game_module.AI(game_module.Game())\n'
+)
+
+
+# runs python with the given args, returning the seconds it took and its stderr
+def _python(*args):
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable] + list(args),
+        cwd=_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    stderr = process.communicate()[1].decode('utf-8')
+    return time.perf_counter() - started, stderr
+
+
+def parse(importtime):
+    """Parses the output of `python -X importtime`.
+
+    Args:
+        importtime (str): What python wrote to stderr.
+
+    Returns:
+        list[tuple]: (module, depth, self seconds, cumulative seconds) for
+        each import, in the order they finished
+    """
+    imports = []
+    for line in importtime.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            imports.append((module, (len(indent) - 1) // 2, int(own) / 1e6, int(cumulative) / 1e6))
+    return imports
+
+
+def report(game_name, top=15):
+    """Prints how long the client takes to start playing a game, and which
+    imports it spends that time on.
+
+    Args:
+        game_name (str): The game, e.g. 'chess'.
+        top (int): How many of the slowest imports to list.
+    """
+    module = camel_case_converter(game_name)
+    interpreter, ignored = _python('-c', 'pass')
+    startup, importtime = _python('-X', 'importtime', '-c', _STARTUP.format(module))
+    if 'Traceback' in importtime:
+        print(importtime)
+        return
+
+    imports = parse(importtime)
+    total = sum(own for name, depth, own, cumulative in imports)
+
+    print(color.text('cyan') + 'Starting the client for {}:'.format(module) + color.reset())
+    print('  interpreter only        {:8.1f} ms'.format(interpreter * 1000))
+    print('  up to the AI created    {:8.1f} ms'.format(startup * 1000))
+    print('  of which imports        {:8.1f} ms ({} modules)'.format(total * 1000, len(imports)))
+
+    print(color.text('cyan') + '\nTop level imports by cumulative time:' + color.reset())
+    for name, depth, own, cumulative in sorted(imports, key=lambda i: -i[3]):
+        if depth == 0 and cumulative >= 0.001:
+            print('  {:8.1f} ms  {}'.format(cumulative * 1000, name))
+
+    print(color.text('cyan') + '\nSlowest imports by their own time:' + color.reset())
+    for name, depth, own, cumulative in sorted(imports, key=lambda i: -i[2])[:top]:
+        print('  {:8.1f} ms  {}'.format(own * 1000, name))
@@ -0,0 +1,70 @@
+# Log buffer: queues the AI's GameObject.log calls instead of running each on
+# the server as it is made, which blocks the AI for a round trip per line.
+# The client sends the queued logs once per turn, back-to-back, before it
+# finishes the turn, unless the policy says to drop them.
+
+MODES = ('buffered', 'off')
+
+
+# @class LogBuffer: the logs queued this turn, and the policy for when to drop them
+class LogBuffer():
+    def __init__(self, mode='buffered', limit=None, reserve=0.05):
+        """Creates a log buffer.
+
+        Args:
+            mode (str): 'buffered' to send the logs at the end of each turn,
+                or 'off' to drop every log, e.g. for tournaments.
+            limit (int): The most logs to keep per turn, later ones are
+                dropped, or None for no limit.
+            reserve (float): Drop the turn's logs instead of sending them if
+                the AI has fewer seconds than this left in its turn budget.
+        """
+        if mode not in MODES:
+            raise ValueError('Unknown log mode "{}", expected one of {}'.format(mode, ', '.join(MODES)))
+        self._mode = mode
+        self._limit = limit
+        self._reserve = reserve
+        self._queued = []
+
+    @property
+    def mode(self):
+        """'buffered' or 'off'.
+
+        :rtype: str
+        """
+        return self._mode
+
+    def __len__(self):
+        return len(self._queued)
+
+    def add(self, caller, message):
+        """Queues a log, unless the policy drops it right away.
+
+        Args:
+            caller (BaseGameObject): The game object logging the message.
+            message (str): The message to log.
+
+        Returns:
+            str: None if queued, else why it was dropped, 'off' or 'limit'
+        """
+        if self._mode == 'off':
+            return 'off'
+        if self._limit is not None and len(self._queued) >= self._limit:
+            return 'limit'
+        self._queued.append((caller, 'log', {'message': message}))
+        return None
+
+    def take(self, budget=None):
+        """Takes the queued logs out of the buffer, to be sent.
+
+        Args:
+            budget (TurnBudget): The AI's budget for the current turn, if any.
+
+        Returns:
+            list[tuple]: (caller, function name, args) of each log to send,
+            empty if the logs were dropped as the turn is short on time
+        """
+        queued, self._queued = self._queued, []
+        if budget is not None and budget.remaining() < self._reserve:
+            return []
+        return queued
@@ -0,0 +1,107 @@
+# Memoize: caching of AI helper functions based on the game state they read
+from collections import OrderedDict
+import functools
+import threading
+from joueur.base_ai import BaseAI
+from joueur.delta_mergeable import DeltaMergeable
+
+
+def memoize_on_state(maxsize=128, depends_on=None):
+    """Decorator that caches the results of an AI helper function (such as
+    pathfinding, threat maps, or scoring) until the game state it reads
+    changes.
+
+    Results are keyed by the arguments, and are only re-used while the
+    versions of the game objects the helper reads are unchanged. By default
+    those are the game objects passed as arguments (including inside lists,
+    tuples, sets, and dicts). Passing the AI or the Game itself, as methods on
+    your AI do via `self`, depends on the entire game, so those results are
+    re-computed after every delta. The least recently used results are
+    evicted once more than `maxsize` are cached.
+
+    Args:
+        maxsize (int): The maximum number of results to keep cached.
+        depends_on (callable): Optional function called with the same
+            arguments as the helper, returning the game objects the helper
+            reads. Use it to narrow or widen the default dependencies.
+
+    Returns:
+        callable: the decorator to wrap the helper function with
+    """
+    def decorator(function):
+        cache = OrderedDict()
+        lock = threading.Lock()
+        info = {'hits': 0, 'misses': 0}
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = _freeze((args, kwargs))
+            dependencies = []
+            if depends_on is not None:
+                _find_dependencies(depends_on(*args, **kwargs), dependencies)
+            else:
+                _find_dependencies((args, kwargs), dependencies)
+            stamp = tuple(d._version for d in dependencies)
+
+            with lock:
+                if key in cache and cache[key][0] == stamp:
+                    cache.move_to_end(key)
+                    info['hits'] += 1
+                    return cache[key][1]
+
+            result = function(*args, **kwargs)
+
+            with lock:
+                info['misses'] += 1
+                cache[key] = (stamp, result)
+                cache.move_to_end(key)
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+
+            return result
+
+        def cache_info():
+            with lock:
+                return {
+                    'hits': info['hits'],
+                    'misses': info['misses'],
+                    'maxsize': maxsize,
+                    'size': len(cache)
+                }
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+                info['hits'] = 0
+                info['misses'] = 0
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
+
+
+# makes the arguments hashable so they can be used as a cache key
+def _freeze(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return frozenset((k, _freeze(v)) for k, v in value.items())
+    return value
+
+
+# collects every game and game object the value refers to
+def _find_dependencies(value, found):
+    if isinstance(value, DeltaMergeable):
+        found.append(value)
+    elif isinstance(value, BaseAI):
+        found.append(value.game)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for v in value:
+            _find_dependencies(v, found)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _find_dependencies(v, found)
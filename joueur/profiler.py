@@ -0,0 +1,283 @@
+# Profiler: profiles a live game, with its results split by what the client
+# was doing at the time, its phase:
+#   merge   - merging deltas from the server into the game state
+#   ai      - running the AI's code, e.g. game_updated and run_turn
+#   network - waiting on the server, including run_on_server round trips
+#   other   - everything else, e.g. framing events and sending commands
+# Every profiler also writes turns.tsv, the seconds spent in each phase per turn.
+import collections
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import joueur.ansi_color_coder as color
+
+PHASES = ('merge', 'ai', 'network', 'other')
+
+
+# @class _Phase: a context manager entering a phase of a profiler
+class _Phase():
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._profiler._enter(self._name)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profiler._exit()
+        return False
+
+
+# @class Profiler: tracks the client's phases and the time spent in each, per turn
+class Profiler():
+    def __init__(self, output='profile'):
+        """Creates a profiler.
+
+        Args:
+            output (str): The directory to write the results to.
+        """
+        self._output = output
+        self._stack = ['other']
+        self._since = None
+        self._turn = 0
+        self._turn_values = collections.OrderedDict()
+        self._turns = []
+        self._totals = collections.OrderedDict((phase, 0.0) for phase in PHASES)
+        self._thread_ident = None
+        self._started = False
+        self._stopped = False
+
+    @property
+    def current_phase(self):
+        """The phase the client is in right now.
+
+        :rtype: str
+        """
+        return self._stack[-1]
+
+    def phase(self, name):
+        """Gets a context manager for a phase, which can be nested, e.g. the
+        network phase of a run_on_server call inside the ai phase.
+
+        Args:
+            name (str): One of PHASES.
+
+        Returns:
+            a context manager entering the phase
+        """
+        return _Phase(self, name)
+
+    def start(self):
+        """Starts profiling the calling thread."""
+        if self._started:
+            return
+        self._started = True
+        os.makedirs(self._output, exist_ok=True)
+        self._thread_ident = threading.get_ident()
+        self._since = time.perf_counter()
+        self._start()
+        self._switched(None, self.current_phase)
+
+    def end_turn(self):
+        """Ends the current turn, recording the time spent in each phase during it."""
+        if not self._started or self._stopped:
+            return
+        self._account()
+        self._turn += 1
+        self._turns.append((self._turn, self._turn_values))
+        self._turn_values = collections.OrderedDict()
+        self._turn_ended(self._turn)
+
+    def stop(self):
+        """Stops profiling and writes the results, it is safe to call more
+        than once, e.g. once the game is over and when exiting."""
+        if not self._started or self._stopped:
+            return
+        self._account()
+        self._switched(self.current_phase, None)
+        self._stopped = True
+        if self._turn_values:
+            self._turns.append((self._turn + 1, self._turn_values))
+        self._stop()
+        self._write_turns()
+
+        print(color.text('cyan') + 'Profile written to {}: {}'.format(
+            self._output,
+            ', '.join('{} {:.3f}s'.format(phase, seconds) for phase, seconds in self._totals.items())
+        ) + color.reset())
+
+    def _path(self, file_name):
+        return os.path.join(self._output, file_name)
+
+    # adds the time since the last phase switch to the current phase
+    def _account(self):
+        now = time.perf_counter()
+        phase = self.current_phase
+        seconds = now - self._since
+        self._since = now
+        self._totals[phase] = self._totals.get(phase, 0.0) + seconds
+        self._add('{}_s'.format(phase), seconds)
+
+    def _add(self, column, amount):
+        self._turn_values[column] = self._turn_values.get(column, 0) + amount
+
+    def _enter(self, name):
+        if self._started and not self._stopped:
+            self._account()
+            self._switched(self._stack[-1], name)
+        self._stack.append(name)
+
+    def _exit(self):
+        if self._started and not self._stopped:
+            self._account()
+            self._switched(self._stack[-1], self._stack[-2])
+        self._stack.pop()
+
+    def _write_turns(self):
+        columns = []
+        for turn, values in self._turns:
+            for column in values:
+                if column not in columns:
+                    columns.append(column)
+
+        with open(self._path('turns.tsv'), 'w') as out:
+            out.write('\t'.join(['turn'] + columns) + '\n')
+            for turn, values in self._turns:
+                out.write('\t'.join([str(turn)] + [
+                    '{:.6f}'.format(values[c]) if isinstance(values.get(c), float) else str(values.get(c, 0))
+                    for c in columns
+                ]) + '\n')
+
+    # hooks for the kinds of profilers
+    def _start(self):
+        pass
+
+    def _switched(self, old_phase, new_phase):
+        pass
+
+    def _turn_ended(self, turn):
+        pass
+
+    def _stop(self):
+        pass
+
+
+# @class CProfiler: profiles every function call with cProfile, into {phase}.prof files readable by pstats
+class CProfiler(Profiler):
+    def __init__(self, output='profile'):
+        Profiler.__init__(self, output)
+        self._profiles = {phase: cProfile.Profile() for phase in PHASES}
+
+    def _switched(self, old_phase, new_phase):
+        if old_phase is not None:
+            self._profiles[old_phase].disable()
+        if new_phase is not None:
+            self._profiles[new_phase].enable()
+
+    def _stop(self):
+        for phase, profile in self._profiles.items():
+            profile.dump_stats(self._path('{}.prof'.format(phase)))
+
+
+# @class SamplingProfiler: samples the client's stack on a timer thread, into {phase}.folded collapsed stacks for flamegraphs
+class SamplingProfiler(Profiler):
+    def __init__(self, output='profile', interval=0.005):
+        """Creates a sampling profiler.
+
+        Args:
+            output (str): The directory to write the results to.
+            interval (float): The seconds between samples.
+        """
+        Profiler.__init__(self, output)
+        self._interval = interval
+        self._samples = {phase: collections.Counter() for phase in PHASES}
+        self._sampler = None
+        self._sampling = threading.Event()
+
+    def _start(self):
+        self._sampling.set()
+        self._sampler = threading.Thread(target=self._sample_loop)
+        self._sampler.daemon = True
+        self._sampler.start()
+
+    def _sample_loop(self):
+        while self._sampling.is_set():
+            time.sleep(self._interval)
+            frame = sys._current_frames().get(self._thread_ident)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                name = getattr(code, 'co_qualname', code.co_name) # only Python 3.11+ has qualified names
+                stack.append('{}:{}'.format(os.path.basename(code.co_filename), name))
+                frame = frame.f_back
+            self._samples[self.current_phase][';'.join(reversed(stack))] += 1
+
+    def _stop(self):
+        self._sampling.clear()
+        self._sampler.join()
+        for phase, samples in self._samples.items():
+            with open(self._path('{}.folded'.format(phase)), 'w') as out:
+                for stack, count in samples.most_common():
+                    out.write('{} {}\n'.format(stack, count))
+
+
+# @class MemoryProfiler: tracks the memory allocated in each phase, and writes a tracemalloc snapshot every N turns
+class MemoryProfiler(Profiler):
+    def __init__(self, output='profile', every=10):
+        """Creates a memory profiler.
+
+        Args:
+            output (str): The directory to write the results to.
+            every (int): The number of turns between snapshots.
+        """
+        Profiler.__init__(self, output)
+        self._every = max(1, every)
+        self._traced = 0
+
+    def _start(self):
+        tracemalloc.start()
+        self._traced = tracemalloc.get_traced_memory()[0]
+
+    def _switched(self, old_phase, new_phase):
+        traced = tracemalloc.get_traced_memory()[0]
+        if old_phase is not None:
+            self._add('{}_bytes'.format(old_phase), traced - self._traced)
+        self._traced = traced
+
+    def _turn_ended(self, turn):
+        if turn % self._every == 0:
+            tracemalloc.take_snapshot().dump(self._path('turn-{}.snapshot'.format(turn)))
+
+    def _stop(self):
+        tracemalloc.take_snapshot().dump(self._path('final.snapshot'))
+        tracemalloc.stop()
+
+
+PROFILERS = {
+    'cprofile': CProfiler,
+    'sampling': SamplingProfiler,
+    'tracemalloc': MemoryProfiler,
+}
+
+
+def create(kind, output='profile', every=10):
+    """Creates a profiler by the name given on the command line.
+
+    Args:
+        kind (str): 'cprofile', 'sampling', or 'tracemalloc'.
+        output (str): The directory to write the results to.
+        every (int): The number of turns between tracemalloc snapshots.
+
+    Returns:
+        Profiler: the new profiler
+    """
+    if kind == 'tracemalloc':
+        return MemoryProfiler(output, every)
+    return PROFILERS[kind](output)
@@ -1,16 +1,38 @@
+import copy
 import importlib.util
 import joueur.client
+import json
+import os
+import signal
+import socket
 import sys
+import threading
 import joueur.error_code as error_code
+from joueur.trace import Tracer
+from joueur.log_buffer import LogBuffer
 from joueur.game_manager import GameManager
 from joueur.utilities import camel_case_converter
 import joueur.ansi_color_coder as color
 
 
-def run(args):
-    split_server = args.server.split(":")
-    args.server = split_server[0]
-    args.port = int((len(split_server) == 2 and split_server[1])) or args.port
+def run(args, preloader=None):
+    if not args.server.startswith(joueur.client.UNIX_PREFIX):
+        split_server = args.server.split(":")
+        args.server = split_server[0]
+        args.port = int((len(split_server) == 2 and split_server[1])) or args.port
+
+    if getattr(args, 'profile', None):
+        from joueur import profiler # only imported when needed, as cProfile is slow to import
+        joueur.client.set_profiler(profiler.create(
+            args.profile, args.profile_output, args.profile_every
+        ))
+    if getattr(args, 'trace', None):
+        joueur.client.set_tracer(Tracer(args.trace))
+    if getattr(args, 'logs', 'direct') != 'direct':
+        joueur.client.set_log_buffer(LogBuffer(args.logs, args.log_limit, args.log_reserve))
+
+    # the game is usually already known, so load it while connecting
+    preloader = preloader or _Preloader(args.game, args.ai_settings)
 
     joueur.client.connect(args.server, args.port, args.print_io)
 
@@ -18,7 +40,66 @@ def run(args):
     game_name = joueur.client.wait_for_event("named")
 
     module_str = "games." + camel_case_converter(game_name)
+    preloaded = preloader.result(module_str)
+    if preloaded:
+        module, game, ai = preloaded
+    else:
+        module, game, ai = _load(game_name, module_str)
+        ai.set_settings(args.ai_settings)
+        preloader = _Preloader.warm_up(ai)
+
+    manager = GameManager(game, ai.cold_fields)
+
+    joueur.client.setup(game, ai, manager)
+
+    ai.set_game_manager(manager)
+
+    joueur.client.send("play", {
+        'gameName': game_name,
+        'password': args.password,
+        'requestedSession': args.session,
+        'clientType': "Python",
+        'playerName': args.name or ai.get_name() or "Python Player",
+        'playerIndex': args.index,
+        'gameSettings': args.game_settings
+    })
+
+    lobby_data = joueur.client.wait_for_event("lobbied")
+
+    print('{}In Lobby for game "{}" in session "{}".{}'.format(
+            color.text("cyan"),
+            lobby_data['gameName'],
+            lobby_data['gameSession'],
+            color.reset()
+        )
+    )
+
+    manager.set_constants(lobby_data['constants'])
+
+    start_data = joueur.client.wait_for_event("start")
+
+    print(color.text("green") + "Game is starting." + color.reset())
 
+    preloader.join()
+
+    ai.set_player(game.get_game_object(start_data['playerID']))
+    try:
+        with joueur.client.phase('ai'):
+            ai.start()
+            ai.game_updated()
+    except:
+        error_code.handle_error(
+            error_code.AI_ERRORED,
+            sys.exc_info()[0],
+            'AI errored during game initialization'
+        )
+
+    ai._start_pondering()
+
+    joueur.client.play()
+
+
+def _load(game_name, module_str):
     spec = importlib.util.find_spec(module_str)
     if spec is None:
         error_code.handle_error(
@@ -48,47 +129,201 @@ def run(args):
             'Probably a syntax error in your AI.'
         )
 
-    manager = GameManager(game)
+    return module, game, ai
 
-    joueur.client.setup(game, ai, manager)
 
-    ai.set_settings(args.ai_settings)
+# @class _Preloader: imports a game and creates its AI on a background thread, then warms the AI up
+class _Preloader():
+    def __init__(self, game_name=None, ai_settings=None, ai=None):
+        self._module_str = "games." + camel_case_converter(game_name) if game_name else None
+        self._ai_settings = ai_settings
+        self._loaded = threading.Event()
+        self._preloaded = None
+        self._ai = ai
+        self._warm_up_error = None
+        self._client = joueur.client.current()
+        self._thread = threading.Thread(target=self._load)
+        self._thread.daemon = True
+        self._thread.start()
 
-    joueur.client.send("play", {
-        'gameName': game_name,
-        'password': args.password,
-        'requestedSession': args.session,
-        'clientType': "Python",
-        'playerName': args.name or ai.get_name() or "Python Player",
-        'playerIndex': args.index,
-        'gameSettings': args.game_settings
-    })
+    @staticmethod
+    def warm_up(ai):
+        return _Preloader(ai=ai)
 
-    lobby_data = joueur.client.wait_for_event("lobbied")
+    def _load(self):
+        joueur.client.set_current(self._client) # the session's client, not the process wide one
+        if self._ai is None:
+            try:
+                if importlib.util.find_spec(self._module_str) is not None:
+                    module = importlib.import_module(self._module_str)
+                    game = module.Game()
+                    ai = module.AI(game)
+                    ai.set_settings(self._ai_settings)
+                    self._preloaded = (module, game, ai)
+                    self._ai = ai
+            except:
+                pass # loaded again once the server names the game, to report the error
+            finally:
+                self._loaded.set()
 
-    print('{}In Lobby for game "{}" in session "{}".{}'.format(
-            color.text("cyan"),
-            lobby_data['gameName'],
-            lobby_data['gameSession'],
-            color.reset()
-        )
-    )
+        if self._ai is not None:
+            try:
+                self._ai.warm_up()
+            except:
+                self._warm_up_error = sys.exc_info()
 
-    manager.set_constants(lobby_data['constants'])
+    # the (module, game, ai) preloaded, if they are for the named game
+    def result(self, module_str):
+        if module_str != self._module_str:
+            return None
+        self._loaded.wait()
+        return self._preloaded
 
-    start_data = joueur.client.wait_for_event("start")
+    def join(self):
+        self._thread.join()
+        if self._warm_up_error:
+            error_code.handle_error(
+                error_code.AI_ERRORED,
+                self._warm_up_error,
+                'AI errored while warming up'
+            )
 
-    print(color.text("green") + "Game is starting." + color.reset())
 
-    ai.set_player(game.get_game_object(start_data['playerID']))
+# plays several game sessions at once in this process, each on its own thread
+# with its own Client, returning once all of them are over
+def run_sessions(args, sessions):
+    threads = []
+    for i in range(sessions):
+        session_args = copy.copy(args)
+        if getattr(args, 'profile', None):
+            session_args.profile_output = os.path.join(args.profile_output, 'session-{}'.format(i))
+        if getattr(args, 'trace', None):
+            root, extension = os.path.splitext(args.trace)
+            session_args.trace = '{}-{}{}'.format(root, i, extension)
+        thread = threading.Thread(target=_run_session, args=(session_args,))
+        thread.start()
+        threads.append(thread)
+
+    for thread in threads:
+        thread.join()
+
+
+def _run_session(args):
+    joueur.client.set_current(joueur.client.Client())
     try:
-        ai.start()
-        ai.game_updated()
-    except:
+        run(args)
+    except joueur.client.SessionEnded:
+        pass
+
+
+# the args a worker session may be requested with, instead of the server's
+_WORKER_OVERRIDES = ('server', 'port', 'name', 'index', 'password', 'session', 'game_settings')
+
+# seconds to wait for a request's line, so one silent connection cannot block the rest
+_REQUEST_TIMEOUT = 10
+
+
+def serve_workers(args, port):
+    """Imports the game and creates a warmed up AI once, then waits for
+    requests to play a session. Each request forks a child process from this
+    one which plays the session, so it starts without paying for the
+    interpreter, imports, or AI warm up. Needs os.fork, so not on Windows.
+
+    Args:
+        args (argparse.Namespace): The command line args of each session.
+        port (int): The localhost port to listen for requests on, see
+            `request_worker`.
+    """
+    if not hasattr(os, 'fork'):
         error_code.handle_error(
-            error_code.AI_ERRORED,
-            sys.exc_info()[0],
-            'AI errored during game initialization'
+            error_code.INVALID_ARGS,
+            None,
+            'Serving workers needs os.fork, which this platform does not have.'
         )
 
-    joueur.client.play()
+    preloader = _Preloader(args.game, args.ai_settings)
+    preloader.join()
+    module_str = "games." + camel_case_converter(args.game)
+    if not preloader.result(module_str):
+        _load(args.game, module_str) # reports why it could not be loaded
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('localhost', int(port)))
+    listener.listen(128)
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN) # so finished workers are reaped
+
+    print(color.text("cyan") + 'Serving workers for {} on localhost:{}'.format(
+        args.game, listener.getsockname()[1]) + color.reset())
+
+    try:
+        while True:
+            connection, address = listener.accept()
+            with connection:
+                try:
+                    _serve_request(connection, listener, args, preloader)
+                except (ValueError, OSError) as e:
+                    # only this request failed, so keep serving the others
+                    print(color.text("yellow") + 'Bad worker request: {}'.format(e) + color.reset())
+                    try:
+                        connection.sendall((json.dumps({'error': str(e)}) + '\n').encode('utf-8'))
+                    except OSError:
+                        pass # they already hung up
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+
+
+# reads one request for a worker session, forks the worker, and replies with its pid
+def _serve_request(connection, listener, args, preloader):
+    connection.settimeout(_REQUEST_TIMEOUT)
+    line = connection.makefile('r', encoding='utf-8').readline()
+    if not line:
+        return # they hung up without a request, e.g. checking we are up
+    request = json.loads(line)
+    if not isinstance(request, dict):
+        raise ValueError('expected a JSON object, got {}'.format(type(request).__name__))
+
+    session_args = copy.copy(args)
+    for key in _WORKER_OVERRIDES:
+        if key in request:
+            setattr(session_args, key, request[key])
+
+    pid = os.fork()
+    if pid == 0:
+        connection.close()
+        listener.close()
+        _run_worker(session_args, preloader)
+    connection.sendall((json.dumps({'pid': pid}) + '\n').encode('utf-8'))
+
+
+# plays a single session in a forked worker, never returning
+def _run_worker(args, preloader):
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    try:
+        run(args, preloader)
+    finally:
+        os._exit(1)
+
+
+def request_worker(port, **overrides):
+    """Asks a process serving workers to play a session.
+
+    Args:
+        port (int): The localhost port the workers are served on.
+        **overrides: Any of server, port, name, index, password, session,
+            and game_settings to play this session with.
+
+    Returns:
+        int: the process id of the worker playing the session
+
+    Raises:
+        ValueError: if the process serving workers rejected the request
+    """
+    with socket.create_connection(('localhost', int(port))) as connection:
+        connection.sendall((json.dumps(overrides) + '\n').encode('utf-8'))
+        reply = json.loads(connection.makefile('r').readline())
+    if 'error' in reply:
+        raise ValueError('Worker request rejected: {}'.format(reply['error']))
+    return reply['pid']
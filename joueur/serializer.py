@@ -1,4 +1,5 @@
 # Serializer: functions to serialize and unserialize json communication strings
+from sys import intern
 from joueur.base_game_object import BaseGameObject
 
 def is_game_object_reference(d):
@@ -7,36 +8,108 @@ def is_game_object_reference(d):
 def is_object(obj):
     return (isinstance(obj, dict) or isinstance(obj, list)) or isinstance(obj, BaseGameObject)
 
+# the types sent as is, checked by exact type as that is fastest
+_PRIMITIVES = frozenset([str, int, float, bool, type(None)])
+
+
+def _serialize_game_object(obj):
+    return {'id': obj.id}
+
+
+def _serialize_sequence(data):
+    return [value if type(value) in _PRIMITIVES else serialize(value) for value in data]
+
+
+def _serialize_dict(data):
+    return {
+        key: value if type(value) in _PRIMITIVES else serialize(value)
+        for key, value in data.items()
+    }
+
+
+# how to serialize each type, sub classes get added the first time they are seen
+_serializers = {
+    list: _serialize_sequence,
+    tuple: _serialize_sequence,
+    set: _serialize_sequence,
+    frozenset: _serialize_sequence,
+    dict: _serialize_dict,
+}
+
+
+def _serializer_for(cls):
+    if issubclass(cls, BaseGameObject):
+        serializer = _serialize_game_object
+    elif issubclass(cls, dict):
+        serializer = _serialize_dict
+    elif issubclass(cls, (list, tuple, set, frozenset)):
+        serializer = _serialize_sequence
+    else:
+        serializer = None
+    _serializers[cls] = serializer
+    return serializer
+
+
 def serialize(data):
-    if not isinstance(data, (list, dict, BaseGameObject)):
-        return data
+    """Serializes data to send to the server, game objects become
+    {'id': ...} references, and lists, tuples, and sets become lists.
 
-    if isinstance(data, BaseGameObject):
-        return {'id': data.id}
+    Args:
+        data: The data, e.g. the args of a run_on_server call.
 
-    serialized = {}
-    for key in data:
-        value = data[key]
-        if is_object(value):
-            serialized[key] = serialize(value)
-        else:
-            serialized[key] = value
-    return serialized
+    Returns:
+        the data, json serializable
+    """
+    cls = type(data)
+    if cls in _PRIMITIVES:
+        return data
+
+    serializer = _serializers[cls] if cls in _serializers else _serializer_for(cls)
+    return serializer(data) if serializer else data
 
 def deserialize(data, game):
-    if not isinstance(data, (list, dict, BaseGameObject)):
+    """Deserializes data sent by the server, {'id': ...} references become
+    the game objects they refer to (or None if not found), and strings are
+    interned. Deeply nested data is handled without recursion.
+
+    Args:
+        data: The data, e.g. the returned value of a `ran` event.
+        game (BaseGame): The game to find the referenced game objects in.
+
+    Returns:
+        the deserialized data
+    """
+    cls = type(data)
+    if cls is str:
+        return intern(data)
+    if cls is not dict and cls is not list:
         return data
 
-    if is_game_object_reference(data):
-        return game.get_game_object(data['id'])
+    game_objects = game.game_objects if game is not None else {}
+    if cls is dict and len(data) == 1 and 'id' in data:
+        return game_objects.get(data['id'])
 
-    # else if we got here it's a list or dict
-    deserialized = [None] * len(data) if isinstance(data, list) else {}
-    seq_iter = data.items if isinstance(data, dict) else enumerate(data)
-    for key, value in seq_iter:
-        if is_object(value):
-            deserialized[key] = deserialize(value, game)
-        else:
-            deserialized[key] = value
+    # the containers left to fill in, as (data, deserialized) pairs
+    root = [None] * len(data) if cls is list else {}
+    pending = [(data, root)]
+    while pending:
+        source, target = pending.pop()
+        items = enumerate(source) if type(source) is list else source.items()
+        for key, value in items:
+            cls = type(value)
+            if cls is str:
+                value = intern(value)
+            elif cls is dict:
+                if len(value) == 1 and 'id' in value:
+                    value = game_objects.get(value['id'])
+                else:
+                    container = {}
+                    pending.append((value, container))
+                    value = container
+            elif cls is list:
+                container = [None] * len(value)
+                pending.append((value, container))
+                value = container
+            target[key] = value
 
-    return deserialized
+    return root
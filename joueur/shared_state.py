@@ -0,0 +1,507 @@
+# Shared state: columnar copies of the game in shared memory, so worker
+# processes can read the game without it being pickled and sent to them.
+#
+# Every game object class (and the game itself) gets its own segment holding
+# a table with a row per game object and a column per field. Numbers and
+# booleans are stored as is, strings as codes into a list of categories, and
+# game objects as their (numeric) id, or -1 for None. Lists and dicts are not
+# stored. All values are float64s, and each column is contiguous so it can be
+# read zero copy, e.g. via `numpy.frombuffer(table.column('x'))`.
+import atexit
+import multiprocessing
+import os
+import pickle
+import struct
+import time
+import uuid
+from joueur.base_game_object import BaseGameObject
+import joueur.state_hash as state_hash
+
+try:
+    from multiprocessing import shared_memory
+    from multiprocessing import resource_tracker
+except ImportError: # Python < 3.8
+    shared_memory = None
+
+_FLOAT_SIZE = 8
+_HEADER_SIZE = 16 # sequence number and layout version, as int64s
+_NUMBER = 'number'
+_STRING = 'string'
+_REFERENCE = 'reference'
+
+
+def _require_shared_memory():
+    if shared_memory is None:
+        raise RuntimeError('Shared game state requires Python 3.8 or newer.')
+
+
+# game object ids are numeric strings, so references can be stored as numbers
+def _id_number(id):
+    try:
+        return float(int(id))
+    except (TypeError, ValueError):
+        return -1.0
+
+
+# which fields of a class can be stored in a table, and how
+def _columns_of(cls):
+    instance = cls()
+    columns = [('_id', _NUMBER)] if hasattr(instance, '_id') else []
+    for name in sorted(state_hash.fields_of(cls) - set(['_id'])):
+        default = getattr(instance, name)
+        if isinstance(default, (bool, int, float)):
+            columns.append((name, _NUMBER))
+        elif isinstance(default, str):
+            columns.append((name, _STRING))
+        elif default is None:
+            columns.append((name, _REFERENCE))
+    return columns
+
+
+# @class _TableWriter: one class's table, owned by the process writing it
+class _TableWriter():
+    def __init__(self, cls, segment_prefix):
+        self.cls = cls
+        self.segment_prefix = segment_prefix
+        self.columns = _columns_of(cls)
+        self.categories = {name: [] for name, kind in self.columns if kind == _STRING}
+        self.codes = {name: {} for name in self.categories}
+        self.rows = {} # id to row index
+        self.free = []
+        self.row_count = 0
+        self.capacity = 0
+        self.segment = None
+        self.values = None
+
+    # returns the closed segment the table was in before, if any, which the
+    # caller unlinks once no reader can still be attaching to it
+    def allocate(self, capacity, version):
+        old_segment, old_values, old_capacity = self.segment, self.values, self.capacity
+        size = _FLOAT_SIZE * (1 + capacity * max(1, len(self.columns)))
+        segment = shared_memory.SharedMemory(
+            name='{}_{}_{}'.format(self.segment_prefix, self.cls.__name__, version),
+            create=True,
+            size=size
+        )
+        values = segment.buf.cast('d')
+
+        if old_values is not None:
+            copied = min(self.row_count, old_capacity)
+            for column in range(len(self.columns)):
+                values[1 + column * capacity:1 + column * capacity + copied] = \
+                    old_values[1 + column * old_capacity:1 + column * old_capacity + copied]
+            old_values.release()
+            old_segment.close()
+
+        values[0] = self.row_count
+        self.segment, self.values, self.capacity = segment, values, capacity
+        return old_segment
+
+    # returns True if the layout had to change
+    def write(self, id, obj):
+        layout_changed = False
+        if id not in self.rows:
+            if self.free:
+                self.rows[id] = self.free.pop()
+            else:
+                self.rows[id] = self.row_count
+                self.row_count += 1
+                if self.row_count > self.capacity:
+                    layout_changed = True
+                    return layout_changed # the caller re-allocates then re-writes
+
+        row = self.rows[id]
+        capacity, values = self.capacity, self.values
+        for column, (name, kind) in enumerate(self.columns):
+            value = getattr(obj, name)
+            if kind == _STRING:
+                codes = self.codes[name]
+                if value not in codes:
+                    codes[value] = len(codes)
+                    self.categories[name].append(value)
+                    layout_changed = True
+                value = codes[value]
+            elif kind == _REFERENCE:
+                value = _id_number(value._id) if isinstance(value, BaseGameObject) else -1.0
+            elif name == '_id':
+                value = _id_number(value)
+            values[1 + column * capacity + row] = float(value)
+        values[0] = self.row_count
+        return layout_changed
+
+    def remove(self, id):
+        if id in self.rows:
+            row = self.rows.pop(id)
+            self.values[1 + row] = -1.0 # ids are always the first column
+            self.free.append(row)
+
+    def layout(self):
+        return {
+            'segment': self.segment.name,
+            'capacity': self.capacity,
+            'columns': [name[1:] for name, kind in self.columns],
+            'categories': {name[1:]: list(values) for name, values in self.categories.items()}
+        }
+
+    def close(self):
+        self.values.release()
+        self.segment.close()
+        self.segment.unlink()
+
+
+# @class SharedGameState: writes columnar tables of the game to shared memory after every merge, for worker processes to read via `SharedGameStateReader`
+class SharedGameState():
+    def __init__(self, manager, initial_capacity=64):
+        _require_shared_memory()
+        self._game = manager.game
+        self._name = 'joueur_{}_{}'.format(os.getpid(), uuid.uuid4().hex[:8])
+        self._layout_version = 0
+        self._layout_segment = None
+        self._retiring = [] # segments replaced by the write in progress
+        self._retired = [] # segments replaced by the last write
+        self._header = shared_memory.SharedMemory(name=self._name, create=True, size=_HEADER_SIZE)
+        self._header_values = self._header.buf.cast('q')
+
+        classes = dict(self._game._game_object_classes)
+        classes['Game'] = type(self._game)
+        self._tables = {}
+        for class_name, cls in classes.items():
+            table = _TableWriter(cls, self._name)
+            table.allocate(initial_capacity, 0)
+            self._tables[class_name] = table
+
+        self._write_everything()
+        manager.add_merge_listener(self._delta_merged)
+
+    @property
+    def name(self):
+        """The name to pass to `SharedGameStateReader` in worker processes.
+
+        :rtype: str
+        """
+        return self._name
+
+    def _table_of(self, obj):
+        return self._tables[type(obj).__name__]
+
+    def _write_everything(self):
+        self._begin_write()
+        layout_changed = self._write(None, self._game)
+        for id, game_object in self._game._game_objects.items():
+            layout_changed = self._write(id, game_object) or layout_changed
+        self._end_write(True)
+
+    # writes a single object, growing its table if needed
+    def _write(self, id, obj):
+        table = self._table_of(obj)
+        if not table.write(id, obj):
+            return False
+        if table.row_count > table.capacity:
+            self._layout_version += 1
+            self._retiring.append(table.allocate(table.capacity * 2, self._layout_version))
+            table.write(id, obj)
+        return True
+
+    def _begin_write(self):
+        self._header_values[0] += 1 # odd while writing
+
+    def _end_write(self, layout_changed):
+        if layout_changed:
+            self._publish_layout()
+        self._header_values[0] += 1
+
+        # readers may still be attaching to the last layout's segments until
+        # they see the new one, so only unlink the segments one write later
+        for segment in self._retired:
+            segment.unlink()
+        self._retired, self._retiring = self._retiring, []
+
+    def _publish_layout(self):
+        self._layout_version += 1
+        blob = pickle.dumps({
+            class_name: table.layout() for class_name, table in self._tables.items()
+        }, pickle.HIGHEST_PROTOCOL)
+
+        segment = shared_memory.SharedMemory(
+            name='{}_layout_{}'.format(self._name, self._layout_version),
+            create=True,
+            size=len(blob) + _FLOAT_SIZE
+        )
+        struct.pack_into('q', segment.buf, 0, len(blob))
+        segment.buf[_FLOAT_SIZE:_FLOAT_SIZE + len(blob)] = blob
+
+        old_segment, self._layout_segment = self._layout_segment, segment
+        self._header_values[1] = self._layout_version
+        if old_segment is not None:
+            old_segment.close()
+            self._retiring.append(old_segment)
+
+    ## invoked after every delta is merged into the game, re-writing only the game objects it changed
+    def _delta_merged(self, delta):
+        self._begin_write()
+        layout_changed = False
+        if any(key != 'gameObjects' for key in delta):
+            layout_changed = self._write(None, self._game)
+
+        for id in delta.get('gameObjects', {}):
+            game_object = self._game._game_objects.get(id)
+            if game_object is None:
+                for table in self._tables.values():
+                    table.remove(id)
+            else:
+                layout_changed = self._write(id, game_object) or layout_changed
+        self._end_write(layout_changed)
+
+    def close(self):
+        """Unlinks all the shared memory segments."""
+        for table in self._tables.values():
+            table.close()
+        if self._layout_segment is not None:
+            self._layout_segment.close()
+            self._layout_segment.unlink()
+        for segment in self._retired + self._retiring:
+            segment.unlink()
+        self._retired, self._retiring = [], []
+        self._header_values.release()
+        self._header.close()
+        self._header.unlink()
+
+
+# attaches to a segment created by another process, without our resource
+# tracker unlinking it once we exit
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError: # Python < 3.13
+        # processes started by multiprocessing share their parent's tracker
+        # whatever the start method, so unregistering after attaching would
+        # also forget the parent's segment, instead never register it
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+# read only float64 or int64 view of a segment, with the view it was cast
+# from, as both must be released before the segment can be closed
+def _read_only_view(segment, format):
+    cast = segment.buf.cast(format)
+    return cast.toreadonly(), cast
+
+
+# @class SharedTable: read only view of one class's table of game objects
+class SharedTable():
+    def __init__(self, layout):
+        self._segment = _attach(layout['segment'])
+        self._values, self._cast = _read_only_view(self._segment, 'd')
+        self._capacity = layout['capacity']
+        self._columns = {name: i for i, name in enumerate(layout['columns'])}
+        self._categories = layout['categories']
+
+    @property
+    def rows(self):
+        """The number of rows in the table. Rows whose id is -1 are unused.
+
+        :rtype: int
+        """
+        return int(self._values[0])
+
+    @property
+    def columns(self):
+        """The names of the columns in this table, e.g. ['id', 'x', 'y'].
+
+        :rtype: list[str]
+        """
+        return list(self._columns)
+
+    def column(self, name):
+        """Gets a zero copy, read only view of a column's values.
+
+        Args:
+            name (str): The name of the field, e.g. 'x' or 'owner'.
+
+        Returns:
+            memoryview: the float64 values of each row
+        """
+        start = 1 + self._columns[name] * self._capacity
+        return self._values[start:start + self.rows]
+
+    def categories(self, name):
+        """Gets the strings the codes in a string column refer to.
+
+        Args:
+            name (str): The name of a string field, e.g. 'type'.
+
+        Returns:
+            list[str]: the string for each code
+        """
+        return self._categories[name]
+
+    def close(self):
+        self._values.release()
+        self._cast.release()
+        self._segment.close()
+
+
+# @class SharedGameStateReader: maps the tables written by a `SharedGameState` in another process
+class SharedGameStateReader():
+    def __init__(self, name):
+        _require_shared_memory()
+        self._header = _attach(name)
+        self._header_values, self._header_cast = _read_only_view(self._header, 'q')
+        self._name = name
+        self._layout_version = None
+        self._tables = {}
+        self._previous_tables = {} # kept open so columns read just before a re-load stay valid
+
+    @property
+    def sequence(self):
+        """The writer's raw sequence number, which is odd while it is
+        writing a delta and increases again once it is done. What was read
+        is only consistent if the sequence was even before reading and is
+        unchanged after, see `consistent` and `read`.
+
+        :rtype: int
+        """
+        return self._header_values[0]
+
+    @property
+    def is_writing(self):
+        """If the writer is in the middle of writing a delta right now.
+
+        :rtype: bool
+        """
+        return self._header_values[0] % 2 == 1
+
+    @property
+    def epoch(self):
+        """The number of deltas the writer has finished writing. On its own
+        it cannot tell if a read overlapped a write, use `read` for that.
+
+        :rtype: int
+        """
+        return self._header_values[0] // 2
+
+    def consistent(self, sequence):
+        """Checks that nothing was written since `sequence` was read, and
+        that no write was in progress then either.
+
+        Args:
+            sequence (int): The `sequence` read before reading the tables.
+
+        Returns:
+            bool: True if what was read in between is consistent
+        """
+        return sequence % 2 == 0 and self._header_values[0] == sequence
+
+    def read(self, function):
+        """Calls a function that reads the tables, calling it again until
+        it did not overlap a write, e.g.
+        `attach(name).read(lambda state: list(state.table('Tile').column('x')))`.
+        Columns are views of the live tables, so the function must copy
+        what it needs out of them before returning.
+
+        Args:
+            function (callable): Called as `function(reader)`.
+
+        Returns:
+            what the function returned on its consistent call
+        """
+        while True:
+            sequence = self._header_values[0]
+            if sequence % 2 == 1:
+                time.sleep(0) # let the writer finish
+                continue
+            try:
+                result = function(self)
+            except (FileNotFoundError, IndexError, KeyError, ValueError):
+                if self.consistent(sequence):
+                    raise
+                continue # a torn read, e.g. of a table being re-allocated
+            if self.consistent(sequence):
+                return result
+
+    def table(self, class_name):
+        """Gets the table of a class of game objects, e.g. 'Tile', or 'Game'
+        for the single row table of the game itself.
+
+        Args:
+            class_name (str): The name of the class.
+
+        Returns:
+            SharedTable: the read only table
+        """
+        if self._header_values[1] != self._layout_version:
+            self._load_layout()
+        return self._tables[class_name]
+
+    def _load_layout(self):
+        while True:
+            version = self._header_values[1]
+            try:
+                tables = self._attach_layout(version)
+                break
+            except FileNotFoundError:
+                if self._header_values[1] == version:
+                    raise
+                # the writer moved on to a newer layout while we attached, and
+                # unlinked this one, so attach to the newer one instead
+
+        for table in self._previous_tables.values():
+            table.close()
+        self._previous_tables, self._tables = self._tables, tables
+        self._layout_version = version
+
+    def _attach_layout(self, version):
+        segment = _attach('{}_layout_{}'.format(self._name, version))
+        length = struct.unpack_from('q', segment.buf, 0)[0]
+        layout = pickle.loads(bytes(segment.buf[_FLOAT_SIZE:_FLOAT_SIZE + length]))
+        segment.close()
+
+        tables = {}
+        try:
+            for name, l in layout.items():
+                tables[name] = SharedTable(l)
+        except FileNotFoundError:
+            for table in tables.values():
+                table.close()
+            raise
+        return tables
+
+    def close(self):
+        for table in list(self._tables.values()) + list(self._previous_tables.values()):
+            table.close()
+        self._header_values.release()
+        self._header_cast.release()
+        self._header.close()
+
+
+_readers = {}
+
+
+# closes the readers before interpreter shutdown, else their segments may be
+# garbage collected before the views of them, which cannot be closed then
+def _close_readers():
+    for reader in _readers.values():
+        reader.close()
+    _readers.clear()
+
+
+def attach(name):
+    """Gets the reader for a shared game state, re-using the same reader for
+    every call in this process. Intended to be called by functions running on
+    worker processes, e.g. `attach(name).table('Tile').column('x')`.
+
+    Args:
+        name (str): The name of the `SharedGameState` to read.
+
+    Returns:
+        SharedGameStateReader: the reader of the shared game state
+    """
+    if not _readers:
+        atexit.register(_close_readers)
+    if name not in _readers:
+        _readers[name] = SharedGameStateReader(name)
+    return _readers[name]
@@ -0,0 +1,121 @@
+# Snapshot: compact bytes blobs of an entire game, for sending to other processes
+import importlib
+import pickle
+from joueur.base_game_object import BaseGameObject
+from joueur.serializer import is_game_object_reference
+import joueur.state_hash as state_hash
+
+_ordered_fields = {}
+
+
+# the state fields of a class, in a stable order so values can be stored flat
+def _fields(cls):
+    if cls not in _ordered_fields:
+        _ordered_fields[cls] = tuple(sorted(state_hash.fields_of(cls)))
+    return _ordered_fields[cls]
+
+
+def encode(value):
+    """Encodes a value so it can be pickled without dragging whole game
+    objects along, by replacing game objects with `{'id': ...}` references,
+    just like the server does.
+
+    Args:
+        value: The value to encode, may contain game objects.
+
+    Returns:
+        the encoded value
+    """
+    if isinstance(value, BaseGameObject):
+        return {'id': value._id}
+    if isinstance(value, list):
+        return [encode(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(encode(v) for v in value)
+    if isinstance(value, dict):
+        return {k: encode(v) for k, v in value.items()}
+    return value
+
+
+def decode(value, game):
+    """Decodes a value made by `encode`, resolving references to the game
+    objects in the given game.
+
+    Args:
+        value: The encoded value.
+        game (BaseGame): The game to look up referenced game objects in.
+
+    Returns:
+        the decoded value
+    """
+    if isinstance(value, dict):
+        if is_game_object_reference(value):
+            return game.get_game_object(value['id'])
+        return {k: decode(v, game) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v, game) for v in value]
+    if isinstance(value, tuple):
+        return tuple(decode(v, game) for v in value)
+    return value
+
+
+def dumps(game):
+    """Serializes the entire state of a game into a compact bytes blob. Each
+    game object is stored as a flat row of its field values.
+
+    Args:
+        game (BaseGame): The game to snapshot.
+
+    Returns:
+        bytes: the snapshot
+    """
+    game_class = type(game)
+    class_names = sorted(game._game_object_classes)
+    class_indexes = {game._game_object_classes[name]: i for i, name in enumerate(class_names)}
+
+    objects = []
+    for id, game_object in game._game_objects.items():
+        row = [class_indexes[type(game_object)], id]
+        for name in _fields(type(game_object)):
+            row.append(encode(getattr(game_object, name)))
+        objects.append(row)
+
+    return pickle.dumps((
+        game_class.__module__,
+        game_class.__name__,
+        game._version,
+        [encode(getattr(game, name)) for name in _fields(game_class)],
+        class_names,
+        objects
+    ), pickle.HIGHEST_PROTOCOL)
+
+
+def loads(blob):
+    """Re-creates a game from a snapshot made by `dumps`.
+
+    Args:
+        blob (bytes): The snapshot.
+
+    Returns:
+        BaseGame: a new game, with new game objects, in the snapshot's state
+    """
+    module_name, class_name, version, game_row, class_names, objects = pickle.loads(blob)
+
+    game = getattr(importlib.import_module(module_name), class_name)()
+    classes = [game._game_object_classes[name] for name in class_names]
+    for row in objects:
+        game._game_objects[row[1]] = classes[row[0]]()
+
+    for row in objects:
+        game_object = game._game_objects[row[1]]
+        for name, value in zip(_fields(classes[row[0]]), row[2:]):
+            setattr(game_object, name, decode(value, game))
+
+    for name, value in zip(_fields(type(game)), game_row):
+        setattr(game, name, decode(value, game))
+
+    game._version = version
+    # not the snapshotted game's hash, as field keys use the builtin hash(),
+    # which is salted differently in every process not forked from ours
+    game._state_hash = None
+    return game
@@ -0,0 +1,325 @@
+# Stand-in server: a local, minimal stand-in for a Cadre game server. It
+# speaks the same protocol as the real server so clients can be played
+# against it, but it knows none of the games' rules. Every command an AI
+# runs succeeds, turns simply alternate between the players, and once the
+# turns run out the winner is picked by a judge function. This makes it
+# useful for testing and benchmarking the client and AIs, not for judging
+# how well they actually play.
+import importlib
+import json
+import os
+import socket
+import threading
+import time
+from joueur.synthetic import SyntheticGame
+from joueur.utilities import camel_case_converter
+
+EOT_CHAR = chr(4)
+DELTA_REMOVED = '&RM'
+DELTA_LIST_LENGTH = '&LEN'
+
+_NS_PER_SECOND = 1e9
+_MAX_ORDERS_PER_TURN = 100
+
+
+class _Disconnected(Exception):
+    pass
+
+
+# @class _Connection: one client connected to the stand-in server
+class _Connection():
+    def __init__(self, sock):
+        self.socket = sock
+        if sock.family != getattr(socket, 'AF_UNIX', None):
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.buffer = ""
+        self.events = []
+
+    def send(self, event, data):
+        self.socket.sendall((json.dumps({
+            'sentTime': int(time.time()),
+            'event': event,
+            'data': data
+        }) + EOT_CHAR).encode('utf-8'))
+
+    def receive(self, timeout=None):
+        self.socket.settimeout(timeout)
+        while not self.events:
+            try:
+                received = self.socket.recv(4096)
+            except socket.timeout:
+                return None
+            except OSError:
+                raise _Disconnected()
+            if not received:
+                raise _Disconnected()
+
+            split = (self.buffer + received.decode('utf-8')).split(EOT_CHAR)
+            self.buffer = split.pop()
+            self.events.extend(json.loads(s) for s in split)
+
+        return self.events.pop(0)
+
+    def close(self):
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+
+
+def fastest_player_wins(players):
+    """The default judge: a player that errored or ran out of time loses,
+    otherwise the player that used the least time wins.
+
+    Args:
+        players (list[dict]): The stats of each player, see `results`.
+
+    Returns:
+        int: the index of the winning player, or None for a draw
+    """
+    ok = [i for i, p in enumerate(players) if not p['errors'] and not p['timed_out']]
+    if len(ok) == 1:
+        return ok[0]
+    if not ok:
+        return None
+
+    times = [sum(players[i]['turn_times']) for i in ok]
+    if times.count(min(times)) > 1:
+        return None
+    return ok[times.index(min(times))]
+
+
+# @class StandInServer: serves a single game session on localhost, on its own thread
+class StandInServer():
+    def __init__(self, game_name, players=2, turns=100, time_limit=10.0,
+                 judge=fastest_player_wins, host='127.0.0.1', port=0, synthetic=None,
+                 path=None):
+        if synthetic is not None and players != 2:
+            raise ValueError('Synthetic game states are only generated for 2 players')
+
+        module = importlib.import_module('games.' + camel_case_converter(game_name))
+        self._game_name = module.Game().name
+        self._order_name = 'runTurn' if hasattr(module.AI, 'run_turn') else 'makeMove'
+        self._player_count = players
+        self._turns = turns
+        self._time_limit = time_limit
+        self._judge = judge
+        # fills the game with a generated state, changing every turn, instead of just its players
+        self._synthetic = SyntheticGame(game_name, **synthetic) if synthetic is not None else None
+        # listens on a Unix domain socket at the path, if given, instead of TCP
+        self._path = path
+        if path:
+            if os.path.exists(path):
+                os.unlink(path)
+            self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._listener.bind(path)
+        else:
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._listener.bind((host, port))
+        self._listener.listen(players)
+        self._thread = None
+        self._connections = []
+        self.players = []
+        self.winner = None
+
+    @property
+    def address(self):
+        """The host:port, or unix:/path, clients should connect to.
+
+        :rtype: str
+        """
+        if self._path:
+            return 'unix:' + self._path
+        host, port = self._listener.getsockname()
+        return '{}:{}'.format(host, port)
+
+    def start(self):
+        """Starts serving the game session on a background thread."""
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def join(self, timeout=None):
+        """Waits for the game session to be over.
+
+        Args:
+            timeout (float): Optional seconds to wait at most.
+        """
+        self._thread.join(timeout)
+
+    def results(self):
+        """Gets the results of the game once it is over.
+
+        Returns:
+            dict: the game name, winner index (or None for a draw), and the
+            stats of each player: their name, if they won, their turn_times
+            in seconds, commands run, errors, and if they timed_out.
+        """
+        return {
+            'game': self._game_name,
+            'winner': self.winner,
+            'players': self.players
+        }
+
+    def _serve(self):
+        try:
+            self._accept_players()
+            self._play()
+        finally:
+            for connection in self._connections:
+                connection.close()
+            self._listener.close()
+            if self._path and os.path.exists(self._path):
+                os.unlink(self._path)
+
+    def _accept_players(self):
+        while len(self._connections) < self._player_count:
+            sock, address = self._listener.accept()
+            connection = _Connection(sock)
+            connection.receive() # alias
+            connection.send('named', self._game_name)
+            play = connection.receive()['data']
+
+            self._connections.append(connection)
+            self.players.append({
+                'name': play.get('playerName') or 'Player {}'.format(len(self.players)),
+                'won': False,
+                'turn_times': [],
+                'commands': 0,
+                'errors': 0,
+                'timed_out': False,
+            })
+
+    def _player_id(self, index):
+        return str(index)
+
+    def _broadcast(self, event, data):
+        for i, connection in enumerate(self._connections):
+            if not self.players[i]['errors']:
+                try:
+                    connection.send(event, data)
+                except OSError:
+                    self.players[i]['errors'] += 1
+
+    def _initial_delta(self):
+        game_objects = {}
+        for i, player in enumerate(self.players):
+            game_objects[self._player_id(i)] = {
+                'id': self._player_id(i),
+                'gameObjectName': 'Player',
+                'logs': {DELTA_LIST_LENGTH: 0},
+                'name': player['name'],
+                'clientType': 'Python',
+                'timeRemaining': self._time_limit * _NS_PER_SECOND,
+                'opponent': {'id': self._player_id((i + 1) % len(self.players))}
+            }
+
+        players = {DELTA_LIST_LENGTH: len(self.players)}
+        for i in range(len(self.players)):
+            players[str(i)] = {'id': self._player_id(i)}
+
+        delta = {
+            'gameObjects': game_objects,
+            'players': players,
+            'session': 'stand-in',
+            'maxTurns': self._turns,
+            'currentTurn': 0,
+        }
+
+        if self._synthetic:
+            synthetic = self._synthetic.initial_delta()
+            for id, player in game_objects.items():
+                synthetic['gameObjects'][id].update(player)
+            delta['gameObjects'] = synthetic['gameObjects']
+            synthetic.update(delta)
+            delta = synthetic
+        return delta
+
+    def _play(self):
+        self._broadcast('lobbied', {
+            'gameName': self._game_name,
+            'gameSession': 'stand-in',
+            'constants': {
+                'DELTA_REMOVED': DELTA_REMOVED,
+                'DELTA_LIST_LENGTH': DELTA_LIST_LENGTH
+            }
+        })
+        self._broadcast('delta', self._initial_delta())
+        for i, connection in enumerate(self._connections):
+            connection.send('start', {'playerID': self._player_id(i)})
+
+        order_index = 0
+        for turn in range(self._turns):
+            current = turn % len(self.players)
+            player = self.players[current]
+            if player['errors'] or player['timed_out']:
+                break
+
+            delta = self._synthetic.turn_delta() if self._synthetic else {}
+            delta['currentTurn'] = turn
+            delta['currentPlayer'] = {'id': self._player_id(current)}
+            self._broadcast('delta', delta)
+
+            started = time.monotonic()
+            for i in range(_MAX_ORDERS_PER_TURN):
+                finished = self._order(current, order_index)
+                order_index += 1
+                if finished is None or finished.get('returned') is not False:
+                    break
+
+            used = time.monotonic() - started
+            player['turn_times'].append(used)
+            remaining = self._time_limit - sum(player['turn_times'])
+            if remaining <= 0:
+                player['timed_out'] = True
+
+            self._broadcast('delta', {'gameObjects': {
+                self._player_id(current): {'timeRemaining': max(0, remaining) * _NS_PER_SECOND}
+            }})
+
+        self._game_over()
+
+    # sends an order to a player, answering the commands they run, until they finish it
+    def _order(self, index, order_index):
+        connection = self._connections[index]
+        player = self.players[index]
+        remaining = self._time_limit - sum(player['turn_times'])
+        deadline = time.monotonic() + max(0, remaining)
+
+        try:
+            connection.send('order', {
+                'name': self._order_name,
+                'index': order_index,
+                'args': []
+            })
+            while True:
+                sent = connection.receive(max(0.001, deadline - time.monotonic()))
+                if sent is None:
+                    player['timed_out'] = True
+                    return None
+                elif sent['event'] == 'run':
+                    player['commands'] += 1
+                    connection.send('ran', True)
+                elif sent['event'] == 'finished':
+                    return sent['data']
+        except (_Disconnected, OSError, ValueError):
+            player['errors'] += 1
+            return None
+
+    def _game_over(self):
+        self.winner = self._judge(self.players)
+
+        game_objects = {}
+        for i, player in enumerate(self.players):
+            player['won'] = (i == self.winner)
+            reason = 'Stand-in judge decided' if self.winner is not None else 'Draw'
+            game_objects[self._player_id(i)] = {
+                'won': player['won'],
+                'lost': not player['won'],
+                'reasonWon': reason if player['won'] else '',
+                'reasonLost': '' if player['won'] else reason
+            }
+
+        self._broadcast('delta', {'gameObjects': game_objects})
+        self._broadcast('over', {})
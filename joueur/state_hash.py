@@ -0,0 +1,124 @@
+# State hash: Zobrist style hashing of a game's state, where every field of
+# the game and its game objects contributes a key that is XORed together. As
+# XOR is its own inverse a single changed field can be swapped out of the hash
+# without re-hashing the rest of the state.
+from joueur.base_game_object import BaseGameObject
+
+_MASK = (1 << 64) - 1
+
+# attributes joueur keeps on games and game objects that are not game state
+_INTERNAL_ATTRIBUTES = frozenset([
+    '_removed',
+    '_version',
+    '_state_hash',
+    '_game_objects',
+    '_game_object_classes',
+    '_cold_fields',
+    '_cold_keys'
+])
+
+_class_fields = {}
+
+
+def fields_of(cls):
+    """Gets the names of the private attributes holding the state of a game
+    or game object class, as declared by its generated __init__.
+
+    Args:
+        cls (type): The Game or GameObject class.
+
+    Returns:
+        frozenset[str]: the attribute names, e.g. {'_id', '_x', '_y'}
+    """
+    if cls not in _class_fields:
+        _class_fields[cls] = frozenset(
+            key for key in vars(cls())
+            if key.startswith('_') and key not in _INTERNAL_ATTRIBUTES
+        )
+    return _class_fields[cls]
+
+
+# a hashable representation of a value, referring to game objects by id
+def _value_key(value):
+    if isinstance(value, BaseGameObject):
+        return ('#', value._id)
+    if isinstance(value, list):
+        return tuple(_value_key(v) for v in value)
+    if isinstance(value, dict):
+        return frozenset((k, _value_key(v)) for k, v in value.items())
+    return value
+
+
+def field_key(owner_id, name, value):
+    """Gets the key a single field contributes to the state hash. Keys are
+    built on the builtin hash(), so they, and state hashes, are only
+    comparable within one process and the processes forked from it.
+
+    Args:
+        owner_id (str): The id of the game object owning the field, or None
+            for fields of the game itself.
+        name (str): The private attribute name of the field, e.g. '_x'.
+        value: The value of the field.
+
+    Returns:
+        int: the 64 bit key for the field
+    """
+    return hash((owner_id, name, _value_key(value))) & _MASK
+
+
+def object_key(owner_id, obj, cold_fields=frozenset()):
+    """Gets the combined key of every field of a game or game object.
+
+    Args:
+        owner_id (str): The id of the game object, or None for the game.
+        obj (DeltaMergeable): The game or game object to hash.
+        cold_fields (frozenset[str]): The fields of the object to leave out.
+
+    Returns:
+        int: the 64 bit key for the object
+    """
+    key = 0
+    for name in fields_of(type(obj)):
+        if name not in cold_fields:
+            key ^= field_key(owner_id, name, getattr(obj, name))
+    return key
+
+
+def full_hash(game):
+    """Hashes the entire state of a game from scratch. The incrementally
+    updated `game.state_hash` should always be equal to this. Cold fields,
+    which the GameManager merges lazily, are not part of the hash.
+
+    Args:
+        game (BaseGame): The game to hash.
+
+    Returns:
+        int: the 64 bit state hash
+    """
+    cold_fields = game._cold_fields
+    key = object_key(None, game, cold_fields.get(type(game), frozenset()))
+    for id, game_object in game._game_objects.items():
+        key ^= object_key(id, game_object, cold_fields.get(type(game_object), frozenset()))
+    return key
+
+
+def update_field(game, obj, name, value):
+    """Sets a field on a game or game object of a forked game, updating the
+    fork's state hash incrementally. Intended for search code that modifies
+    forks of the game, never use this on the game the client is playing.
+
+    Args:
+        game (BaseGame): The forked game owning `obj`.
+        obj (DeltaMergeable): The game, or one of its game objects, to modify.
+        name (str): The name of the field, e.g. 'x' or '_x'.
+        value: The new value for the field.
+    """
+    if not name.startswith('_'):
+        name = '_' + name
+    if game._state_hash is None:
+        setattr(obj, name, value) # not hashed yet, so hashed in whole once read
+        return
+    owner_id = None if obj is game else obj._id
+    game._state_hash ^= field_key(owner_id, name, getattr(obj, name))
+    setattr(obj, name, value)
+    game._state_hash ^= field_key(owner_id, name, value)
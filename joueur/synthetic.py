@@ -0,0 +1,320 @@
+# Synthetic: generates plausible game states for any game in games/, for
+# benchmarks, stress tests, and the stand-in server.
+#
+# Everything is derived from the game's classes: `_game_object_classes`, the
+# private attributes their __init__ declares, and the `:rtype:` (and quoted
+# choices like 'land' or 'water') in their property docstrings. The states
+# are plausible, not valid by the game's rules.
+import importlib
+import math
+import random
+from joueur.class_metadata import field_types
+from joueur.utilities import camel_case_converter, lower_camel_case
+
+DELTA_REMOVED = '&RM'
+DELTA_LIST_LENGTH = '&LEN'
+CONSTANTS = {
+    'DELTA_REMOVED': DELTA_REMOVED,
+    'DELTA_LIST_LENGTH': DELTA_LIST_LENGTH,
+}
+
+_WORDS = ['alpha', 'beta', 'gamma', 'delta']
+_SKIPPED_FIELDS = frozenset(['_id', '_game_object_name', '_logs'])
+_NEIGHBORS = {
+    '_tile_north': (0, -1),
+    '_tile_east': (1, 0),
+    '_tile_south': (0, 1),
+    '_tile_west': (-1, 0),
+}
+
+
+def delta_key(name):
+    """Gets the camelCased key the server uses for a private attribute, e.g.
+    '_game_object_name' is 'gameObjectName'."""
+    return lower_camel_case(name[1:])
+
+
+# @class SyntheticGame: generates an initial state and a stream of per turn deltas for a game
+class SyntheticGame():
+    def __init__(self, game_name, objects=None, width=None, height=None,
+                 counts=None, churn=None, changed_fraction=0.05, seed=0):
+        """Creates a synthetic game.
+
+        Args:
+            game_name (str): The game, e.g. 'pirates' or 'Stardash'.
+            objects (int): Roughly how many game objects to create, used to
+                size the map and object counts not given explicitly.
+            width (int): The width of the map (tiles or space).
+            height (int): The height of the map.
+            counts (dict[str, int]): How many game objects of each class to
+                create, e.g. {'Body': 5000}. Players are always 2.
+            churn (dict[str, int]): How many game objects of each class to
+                create, and remove, every turn, e.g. {'Projectile': 20}.
+            changed_fraction (float): The fraction of numeric fields changed
+                every turn.
+            seed (int): The seed for the random values.
+        """
+        module = importlib.import_module('games.' + camel_case_converter(game_name))
+        self._game = module.Game()
+        self._classes = self._game._game_object_classes
+        self._rng = random.Random(seed)
+        self._churn = churn or {}
+        self._changed_fraction = changed_fraction
+        self._objects = {} # id -> {attribute name: value}, references as {'id': ...}
+        self._class_of = {}
+        self._by_class = {name: [] for name in self._classes}
+        self._next_id = 0
+        self._turn = 0
+        self._sent_lists = {} # (owner id, attribute name) -> the list as last sent
+
+        game_types = field_types(type(self._game))
+        self._width_field = '_map_width' if '_map_width' in game_types else '_size_x'
+        self._height_field = '_map_height' if '_map_height' in game_types else '_size_y'
+        self._has_tiles = 'Tile' in self._classes and '_tiles' in game_types
+
+        others = [n for n in self._classes if n not in ('Player', 'Tile', 'GameObject')]
+        counts = dict(counts or {})
+        if width is None:
+            if objects and self._has_tiles:
+                width = height = max(2, int(math.sqrt(objects * 0.75)))
+            else:
+                width = height = 32
+        self._width = width
+        self._height = height or width
+        if objects:
+            remaining = objects - (self._width * self._height if self._has_tiles else 0)
+            for name in others:
+                counts.setdefault(name, max(1, remaining // max(1, len(others))))
+
+        for i in range(2):
+            self._create('Player')
+        if self._has_tiles:
+            self._create_tiles()
+        for name in others:
+            for i in range(counts.get(name, 20)):
+                self._create(name)
+
+        for id in list(self._objects):
+            self._fill(id)
+
+    @property
+    def width(self):
+        """The width of the map.
+
+        :rtype: int
+        """
+        return self._width
+
+    @property
+    def height(self):
+        """The height of the map.
+
+        :rtype: int
+        """
+        return self._height
+
+    def _create(self, class_name):
+        id = str(self._next_id)
+        self._next_id += 1
+        self._objects[id] = {}
+        self._class_of[id] = class_name
+        self._by_class[class_name].append(id)
+        return id
+
+    def _create_tiles(self):
+        ids = [self._create('Tile') for i in range(self._width * self._height)]
+        types = field_types(self._classes['Tile'])
+        for index, id in enumerate(ids):
+            x, y = index % self._width, index // self._width
+            tile = self._objects[id]
+            tile['_x'], tile['_y'] = x, y
+            for name, (dx, dy) in _NEIGHBORS.items():
+                if name in types:
+                    nx, ny = x + dx, y + dy
+                    inside = 0 <= nx < self._width and 0 <= ny < self._height
+                    tile[name] = {'id': ids[nx + ny * self._width]} if inside else None
+
+    # the ids of the game objects of a class, including its sub classes
+    def _ids_of(self, class_name):
+        cls = self._classes.get(class_name)
+        if cls is None:
+            return []
+        ids = []
+        for name, other in self._classes.items():
+            if issubclass(other, cls):
+                ids.extend(self._by_class[name])
+        return ids
+
+    def _random_value(self, name, kind, detail, owner_id=None):
+        rng = self._rng
+        if kind == 'int' or kind == 'float':
+            if name in ('_x', '_y'):
+                bound = self._width if name == '_x' else self._height
+                return rng.randrange(bound) if kind == 'int' else rng.random() * bound
+            return rng.randint(0, 100) if kind == 'int' else round(rng.random() * 100, 3)
+        if kind == 'bool':
+            return rng.random() < 0.5
+        if kind == 'str':
+            return rng.choice(detail or _WORDS)
+        if kind == 'ref':
+            ids = self._ids_of(detail)
+            return {'id': rng.choice(ids)} if ids else None
+        if kind == 'list':
+            # players own the game objects whose owner they are, everything
+            # else starts out with empty lists
+            if owner_id is not None and detail[0] == 'ref':
+                return [
+                    {'id': id} for id in self._ids_of(detail[1])
+                    if self._objects[id].get('_owner') == {'id': owner_id}
+                ]
+            return []
+        return None
+
+    def _fill(self, id):
+        obj = self._objects[id]
+        class_name = self._class_of[id]
+        types = field_types(self._classes[class_name])
+        for name, (kind, detail) in types.items():
+            if name in _SKIPPED_FIELDS or name in obj or kind in ('list', 'dict', 'unknown'):
+                continue
+            obj[name] = self._random_value(name, kind, detail)
+        if class_name == 'Player':
+            obj['_name'] = 'Player {}'.format(id)
+            obj['_opponent'] = {'id': self._by_class['Player'][1 - self._by_class['Player'].index(id)]}
+
+    # fills the lists of players last, as they depend on everything else
+    def _fill_lists(self, id):
+        obj = self._objects[id]
+        types = field_types(self._classes[self._class_of[id]])
+        owner_id = id if self._class_of[id] == 'Player' else None
+        for name, (kind, detail) in types.items():
+            if kind == 'list' and name not in _SKIPPED_FIELDS:
+                obj[name] = self._random_value(name, kind, detail, owner_id)
+
+    # like the server, only sends the length and the changed indices of lists it sent before
+    def _list_delta(self, key, value):
+        sent = self._sent_lists.get(key)
+        self._sent_lists[key] = list(value)
+        delta = {}
+        for i, v in enumerate(value):
+            if sent is None or i >= len(sent) or sent[i] != v:
+                delta[str(i)] = v
+        if sent is not None and not delta and len(sent) == len(value):
+            return None
+        delta[DELTA_LIST_LENGTH] = len(value)
+        return delta
+
+    def _object_delta(self, id, fields=None):
+        obj = self._objects[id]
+        if fields is None:
+            delta = {
+                'id': id,
+                'gameObjectName': self._class_of[id],
+                'logs': {DELTA_LIST_LENGTH: 0}
+            }
+            fields = obj
+        else:
+            delta = {}
+        for name in fields:
+            value = obj[name]
+            if isinstance(value, list):
+                value = self._list_delta((id, name), value)
+                if value is None:
+                    continue
+            delta[delta_key(name)] = value
+        return delta
+
+    def _game_lists(self):
+        lists = {}
+        for name, (kind, detail) in field_types(type(self._game)).items():
+            if kind == 'list' and detail[0] == 'ref' and name != '_game_objects':
+                value = self._list_delta((None, name), [{'id': id} for id in self._ids_of(detail[1])])
+                if value is not None:
+                    lists[delta_key(name)] = value
+        return lists
+
+    def initial_delta(self):
+        """Creates the first delta the server would send, holding every game
+        object and the game's own fields.
+
+        Returns:
+            dict: the delta
+        """
+        for id in self._by_class['Player']:
+            self._fill_lists(id)
+
+        delta = self._game_lists()
+        delta['gameObjects'] = {id: self._object_delta(id) for id in self._objects}
+        delta.update(self._turn_fields())
+        game_types = field_types(type(self._game))
+        for name, value in ((self._width_field, self._width), (self._height_field, self._height)):
+            if name in game_types:
+                delta[delta_key(name)] = value
+        return delta
+
+    # the fields of the game that advance every turn, for the games that have them
+    def _turn_fields(self):
+        game_types = field_types(type(self._game))
+        fields = {}
+        if '_current_turn' in game_types:
+            fields['currentTurn'] = self._turn
+        if '_current_player' in game_types:
+            fields['currentPlayer'] = {'id': self._by_class['Player'][self._turn % 2]}
+        return fields
+
+    def turn_delta(self):
+        """Creates the delta for the next turn, changing some of the numeric
+        fields, and creating and removing the churned game objects.
+
+        Returns:
+            dict: the delta
+        """
+        self._turn += 1
+        rng = self._rng
+        changed = {}
+
+        candidates = [id for id in self._objects if self._class_of[id] != 'Tile'] or list(self._objects)
+        for id in rng.sample(candidates, max(1, int(len(candidates) * self._changed_fraction))):
+            obj = self._objects[id]
+            numeric = [n for n, v in obj.items() if isinstance(v, (int, float))]
+            if not numeric:
+                continue
+            name = rng.choice(numeric)
+            value = obj[name]
+            if isinstance(value, bool):
+                obj[name] = not value
+            elif name in ('_x', '_y'):
+                bound = self._width if name == '_x' else self._height
+                obj[name] = min(bound - 1, max(0, value + rng.choice((-1, 1))))
+            else:
+                obj[name] = max(0, value + rng.choice((-1, 1)))
+            changed.setdefault(id, set()).add(name)
+
+        game_objects = {id: self._object_delta(id, names) for id, names in changed.items()}
+        delta = {}
+        if self._churn:
+            for class_name, amount in self._churn.items():
+                ids = self._by_class[class_name]
+                for id in ids[:amount]:
+                    game_objects[id] = DELTA_REMOVED
+                    del self._objects[id]
+                    del self._class_of[id]
+                del ids[:amount]
+                for i in range(amount):
+                    id = self._create(class_name)
+                    self._fill(id)
+                    game_objects[id] = self._object_delta(id)
+
+            for id in self._by_class['Player']:
+                self._fill_lists(id)
+                lists = self._object_delta(id, [
+                    n for n, (kind, detail) in field_types(self._classes['Player']).items()
+                    if kind == 'list' and n not in _SKIPPED_FIELDS
+                ])
+                if lists:
+                    game_objects.setdefault(id, {}).update(lists)
+            delta.update(self._game_lists())
+
+        delta['gameObjects'] = game_objects
+        delta.update(self._turn_fields())
+        return delta
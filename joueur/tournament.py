@@ -0,0 +1,288 @@
+# Tournament: plays many self-play games between variants of an AI at once
+# against local stand-in servers, then summarizes how each variant did.
+#
+# Run via `python3 -m joueur.tournament GAME_NAME -v "" -v "depth=3" -g 100`
+# where each variant is the `--aiSettings` string for that variant of the AI.
+# Note the stand-in server knows none of the games' rules, so by default the
+# faster variant wins, see `joueur/stand_in_server.py`.
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import sys
+import threading
+from joueur.run import _run_session
+from joueur.stand_in_server import StandInServer
+
+_CONFIDENCE_Z = 1.96 # 95%
+
+
+def _silence():
+    sys.stdout = open(os.devnull, 'w')
+
+
+def _label(variant):
+    return variant or '(default)'
+
+
+# plays a single game on a worker process, returning its results record
+def _play_game(task):
+    game_name, seats, variants, turns, time_limit, objects = task
+
+    synthetic = {'objects': objects, 'seed': hash(seats)} if objects else None
+    server = StandInServer(game_name, players=len(seats), turns=turns,
+                           time_limit=time_limit, synthetic=synthetic)
+    server.start()
+
+    threads = []
+    for seat, variant in enumerate(seats):
+        args = argparse.Namespace(
+            game=game_name,
+            server=server.address,
+            port=0,
+            name='{}:{}'.format(seat, _label(variants[variant])),
+            index=None,
+            password=None,
+            session='*',
+            game_settings=None,
+            ai_settings=variants[variant] or None,
+            print_io=False
+        )
+        thread = threading.Thread(target=_run_session, args=(args,))
+        thread.daemon = True # so a hung AI can not hang the whole tournament
+        thread.start()
+        threads.append(thread)
+
+    # a generous timeout, each player can use at most time_limit seconds
+    server.join(time_limit * len(seats) + 30)
+    for thread in threads:
+        thread.join(5)
+
+    results = server.results()
+    players = [None] * len(seats)
+    winner = None
+    for index, player in enumerate(results['players']):
+        seat = int(player['name'].split(':')[0])
+        times = player['turn_times']
+        players[seat] = {
+            'variant': seats[seat],
+            'won': player['won'],
+            'turns': len(times),
+            'mean_turn_time': sum(times) / len(times) if times else 0,
+            'max_turn_time': max(times) if times else 0,
+            'commands': player['commands'],
+            'errors': player['errors'],
+            'timed_out': player['timed_out']
+        }
+        if results['winner'] == index:
+            winner = seat
+
+    return {'game': results['game'], 'winner': winner, 'players': players}
+
+
+def schedule(variant_count, games):
+    """Pairs up the variants for each game, cycling through every pairing
+    and alternating who goes first. A single variant plays itself.
+
+    Args:
+        variant_count (int): The number of AI variants.
+        games (int): The number of games to play.
+
+    Returns:
+        list[tuple[int]]: the variant index in each seat, for each game
+    """
+    pairs = list(itertools.combinations(range(variant_count), 2)) or [(0, 0)]
+    seats = []
+    for i in range(games):
+        pair = pairs[i % len(pairs)]
+        seats.append(pair if (i // len(pairs)) % 2 == 0 else tuple(reversed(pair)))
+    return seats
+
+
+def play(game_name, variants, games, processes=None, turns=100, time_limit=10.0, output=None,
+         objects=None):
+    """Plays a tournament, writing each game's results as a line of JSON.
+
+    Args:
+        game_name (str): The game to play, e.g. 'chess'.
+        variants (list[str]): The `--aiSettings` string of each AI variant.
+        games (int): The number of games to play.
+        processes (int): How many games to play at once, defaults to the
+            number of CPU cores.
+        turns (int): The number of turns each game lasts.
+        time_limit (float): The seconds each player has for the whole game.
+        output (str): The path to write the results to, if any.
+        objects (int): Roughly how many game objects to fill each game with,
+            using a synthetic game state, instead of just the players.
+
+    Returns:
+        list[dict]: the results of each game
+    """
+    tasks = [
+        (game_name, seats, variants, turns, time_limit, objects)
+        for seats in schedule(len(variants), games)
+    ]
+    records = []
+
+    out = open(output, 'w') if output else None
+    pool = multiprocessing.Pool(processes, initializer=_silence)
+    try:
+        for record in pool.imap_unordered(_play_game, tasks):
+            records.append(record)
+            if out:
+                out.write(json.dumps(record, separators=(',', ':')) + '\n')
+                out.flush()
+    finally:
+        pool.terminate()
+        if out:
+            out.close()
+
+    return records
+
+
+# the Wilson score interval of a proportion
+def _wilson(score, n):
+    if n == 0:
+        return 0.0, 1.0
+    z2 = _CONFIDENCE_Z * _CONFIDENCE_Z
+    center = (score + z2 / (2 * n)) / (1 + z2 / n)
+    spread = _CONFIDENCE_Z * math.sqrt(score * (1 - score) / n + z2 / (4 * n * n)) / (1 + z2 / n)
+    return max(0.0, center - spread), min(1.0, center + spread)
+
+
+# the Elo difference expected to produce the given score
+def _elo(score):
+    score = min(max(score, 0.001), 0.999)
+    return -400 * math.log10(1 / score - 1)
+
+
+def summarize(records, variants):
+    """Summarizes how each variant did against the rest of the field.
+
+    Args:
+        records (list[dict]): The results of each game.
+        variants (list[str]): The `--aiSettings` string of each AI variant.
+
+    Returns:
+        list[dict]: for each variant its wins, losses, draws, score, Elo
+        relative to the field with a 95% confidence interval, mean turn
+        time, and errors
+    """
+    summaries = []
+    for index, variant in enumerate(variants):
+        wins = losses = draws = errors = turns = 0
+        turn_time = 0.0
+        for record in records:
+            for seat, player in enumerate(record['players']):
+                if player is None or player['variant'] != index:
+                    continue
+                if record['winner'] is None:
+                    draws += 1
+                elif record['winner'] == seat:
+                    wins += 1
+                else:
+                    losses += 1
+                errors += player['errors'] + (1 if player['timed_out'] else 0)
+                turns += player['turns']
+                turn_time += player['mean_turn_time'] * player['turns']
+
+        played = wins + losses + draws
+        score = (wins + draws / 2.0) / played if played else 0.5
+        low, high = _wilson(score, played)
+        summaries.append({
+            'variant': _label(variant),
+            'games': played,
+            'wins': wins,
+            'losses': losses,
+            'draws': draws,
+            'score': score,
+            'elo': _elo(score),
+            'elo_low': _elo(low),
+            'elo_high': _elo(high),
+            'mean_turn_time': turn_time / turns if turns else 0,
+            'errors': errors
+        })
+    return summaries
+
+
+def print_summary(summaries):
+    print('{:<24} {:>5} {:>5} {:>5} {:>5} {:>7} {:>18} {:>10} {:>6}'.format(
+        'variant', 'games', 'wins', 'loss', 'draw', 'score', 'elo (95% ci)', 'ms/turn', 'errors'))
+    for s in summaries:
+        print('{:<24} {:>5} {:>5} {:>5} {:>5} {:>7.3f} {:>18} {:>10.2f} {:>6}'.format(
+            s['variant'][:24], s['games'], s['wins'], s['losses'], s['draws'], s['score'],
+            '{:+.0f} ({:+.0f}, {:+.0f})'.format(s['elo'], s['elo_low'], s['elo_high']),
+            s['mean_turn_time'] * 1000, s['errors']))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Plays many self-play games between variants of an AI against local stand-in servers.'
+    )
+    parser.add_argument(
+        'game',
+        action='store',
+        help='the name of the game to play')
+    parser.add_argument(
+        '-v',
+        '--variant',
+        action='append',
+        dest='variants',
+        help='the --aiSettings of an AI variant, repeat for each variant. Use "" for the default settings')
+    parser.add_argument(
+        '-g',
+        '--games',
+        action='store',
+        dest='games',
+        type=int,
+        default=10,
+        help='the number of games to play')
+    parser.add_argument(
+        '-p',
+        '--processes',
+        action='store',
+        dest='processes',
+        type=int,
+        default=None,
+        help='the number of games to play at once, defaults to the number of CPU cores')
+    parser.add_argument(
+        '-t',
+        '--turns',
+        action='store',
+        dest='turns',
+        type=int,
+        default=100,
+        help='the number of turns each game lasts')
+    parser.add_argument(
+        '--timeLimit',
+        action='store',
+        dest='time_limit',
+        type=float,
+        default=10.0,
+        help='the seconds each player has for an entire game')
+    parser.add_argument(
+        '--objects',
+        action='store',
+        dest='objects',
+        type=int,
+        default=None,
+        help='fill each game with a synthetic state of roughly this many game objects, changing every turn')
+    parser.add_argument(
+        '-o',
+        '--output',
+        action='store',
+        dest='output',
+        default='tournament_results.jsonl',
+        help='the file to write the results of each game to, one JSON object per line')
+    args = parser.parse_args()
+
+    variants = args.variants or ['']
+    records = play(args.game, variants, args.games, args.processes, args.turns, args.time_limit, args.output,
+                   args.objects)
+    print_summary(summarize(records, variants))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# Trace: records spans of what the client is doing as a timeline in the Trace
+# Event Format, viewable in Perfetto (ui.perfetto.dev) or chrome://tracing.
+# Useful to see where a turn's time goes, e.g. stalls waiting on the server
+# and the overhead of each run_on_server round trip.
+import json
+import os
+import threading
+import time
+
+
+# @class _NoSpan: what the client enters instead of a span when not tracing
+class _NoSpan():
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+# @class _Span: a context manager recording a complete event once exited
+class _Span():
+    __slots__ = ['_tracer', '_name', '_args', '_started']
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._started = 0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._tracer.complete(self._name, self._started, time.perf_counter(), self._args)
+        return False
+
+
+# @class Tracer: collects the spans of a client and writes them as a Trace Event Format JSON file
+class Tracer():
+    def __init__(self, path):
+        """Creates a tracer.
+
+        Args:
+            path (str): The file to write the trace to.
+        """
+        self._path = path
+        self._pid = os.getpid()
+        self._events = []
+        self._threads = set()
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        """The file the trace is written to.
+
+        :rtype: str
+        """
+        return self._path
+
+    def span(self, name, **args):
+        """Gets a context manager recording how long its block took.
+
+        Args:
+            name (str): The name of the span, e.g. 'merge'.
+            **args: Metadata shown with the span, e.g. turn=3.
+
+        Returns:
+            a context manager recording the span
+        """
+        return _Span(self, name, args)
+
+    def complete(self, name, started, ended, args=None):
+        """Records a span that already happened.
+
+        Args:
+            name (str): The name of the span.
+            started (float): When it started, from time.perf_counter().
+            ended (float): When it ended, from time.perf_counter().
+            args (dict): Optional metadata shown with the span.
+        """
+        tid = threading.get_ident()
+        event = {
+            'name': name,
+            'ph': 'X',
+            'ts': started * 1e6,
+            'dur': (ended - started) * 1e6,
+            'pid': self._pid,
+            'tid': tid,
+        }
+        if args:
+            event['args'] = args
+
+        with self._lock:
+            if tid not in self._threads:
+                self._threads.add(tid)
+                self._events.append({
+                    'name': 'thread_name',
+                    'ph': 'M',
+                    'pid': self._pid,
+                    'tid': tid,
+                    'args': {'name': threading.current_thread().name}
+                })
+            self._events.append(event)
+
+    def counter(self, name, value):
+        """Records the new value of a counter, shown as its own track.
+
+        Args:
+            name (str): The name of the counter, e.g. 'game_updated_skipped'.
+            value (int): Its value from now on.
+        """
+        event = {
+            'name': name,
+            'ph': 'C',
+            'ts': time.perf_counter() * 1e6,
+            'pid': self._pid,
+            'args': {name: value}
+        }
+        with self._lock:
+            self._events.append(event)
+
+    def write(self):
+        """Writes the trace recorded so far to its file."""
+        with self._lock:
+            events = list(self._events)
+
+        with open(self._path, 'w') as out:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, out)
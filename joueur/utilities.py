@@ -5,3 +5,8 @@ all_cap_re = re.compile('([a-z0-9])([A-Z])')
 def camel_case_converter(name):
     s1 = first_cap_re.sub(r'\1_\2', name)
     return all_cap_re.sub(r'\1_\2', s1).lower()
+
+# the inverse of camel_case_converter, e.g. 'game_object_name' is 'gameObjectName'
+def lower_camel_case(name):
+    parts = name.split('_')
+    return parts[0] + ''.join(p.capitalize() for p in parts[1:])
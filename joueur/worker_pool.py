@@ -0,0 +1,166 @@
+# WorkerPool: processes that search copies of the game in parallel
+import multiprocessing
+import multiprocessing.connection
+import time
+import traceback
+import joueur.snapshot as snapshot
+
+
+class WorkerError(Exception):
+    """Raised when a function run on a worker process raised an exception."""
+    pass
+
+
+# @class WorkerPool: a pool of processes, each holding a copy of the game that is updated once per turn, that run functions on it in parallel
+class WorkerPool():
+    def __init__(self, processes=None):
+        self._processes = processes or multiprocessing.cpu_count()
+        self._workers = []
+        self._outstanding = {}
+        self._generation = 0
+        self._game = None
+        self._blob = None
+
+    @property
+    def processes(self):
+        """The number of worker processes in this pool.
+
+        :rtype: int
+        """
+        return self._processes
+
+    def _start(self):
+        for i in range(self._processes):
+            self._spawn()
+
+    def _spawn(self):
+        parent, child = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_worker_main, args=(child,))
+        process.daemon = True
+        process.start()
+        child.close()
+        self._workers.append((process, parent))
+        self._outstanding[parent] = 0
+        if self._blob is not None:
+            parent.send(('state', self._blob))
+
+    # stops the workers still running tasks past the timeout, and starts new
+    # ones in their place, else their late results would block the next map
+    def _replace_busy(self):
+        for process, connection in list(self._workers):
+            if self._outstanding[connection] > 0:
+                process.terminate()
+                process.join()
+                connection.close()
+                self._workers.remove((process, connection))
+                del self._outstanding[connection]
+                self._spawn()
+
+    def update(self, game):
+        """Sends a compact snapshot of the game to every worker, intended to
+        be called once per turn before `map`.
+
+        Args:
+            game (BaseGame): The game the workers should search.
+        """
+        if not self._workers:
+            self._start()
+
+        self._game = game
+        self._blob = snapshot.dumps(game)
+        for process, connection in self._workers:
+            connection.send(('state', self._blob))
+
+    def map(self, function, tasks, timeout=None):
+        """Runs a function for each task on the workers, in parallel.
+
+        Args:
+            function (callable): A module level function called as
+                `function(game, *task)` on a worker, where game is its copy
+                of the game from the last `update`. Game objects in what it
+                returns are swapped for the same game objects in the game
+                last passed to `update`.
+            tasks (list[tuple]): The arguments for each call. They may
+                contain game objects.
+            timeout (float): Optional seconds to wait for the results, e.g.
+                `self.turn_budget.remaining()`. Tasks that are not done by
+                then are abandoned and their results are None. Workers still
+                running them are terminated and replaced by new ones, which
+                can take a while, so leave some margin.
+
+        Returns:
+            list: the results of each task, in the same order as the tasks
+        """
+        self._generation += 1
+        generation = self._generation
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        results = [None] * len(tasks)
+        pending = list(reversed(list(enumerate(tasks))))
+        remaining = len(tasks)
+
+        while remaining > 0:
+            for connection in self._outstanding:
+                if pending and self._outstanding[connection] == 0:
+                    index, task = pending.pop()
+                    connection.send(('task', generation, index, function, snapshot.encode(tuple(task))))
+                    self._outstanding[connection] += 1
+
+            wait = None if deadline is None else deadline - time.monotonic()
+            if wait is not None and wait <= 0:
+                self._replace_busy() # abandon the rest
+                break
+
+            busy = [c for c in self._outstanding if self._outstanding[c] > 0]
+            for connection in multiprocessing.connection.wait(busy, wait):
+                kind, from_generation, index, value = connection.recv()
+                self._outstanding[connection] -= 1
+                if from_generation != generation:
+                    continue # an abandoned task from an earlier map
+                if kind == 'error':
+                    raise WorkerError(value)
+                results[index] = snapshot.decode(value, self._game)
+                remaining -= 1
+
+        return results
+
+    def close(self):
+        """Stops every worker process."""
+        for process, connection in self._workers:
+            try:
+                connection.send(('stop',))
+            except (OSError, EOFError):
+                pass
+        for process, connection in self._workers:
+            process.join()
+        self._workers = []
+        self._outstanding = {}
+
+
+## the main loop of every worker process
+def _worker_main(connection):
+    # forked workers inherit the parent's ends of the pipes, so recv would
+    # never see EOF once the parent died, hence also wait on the parent
+    parent = getattr(multiprocessing, 'parent_process', lambda: None)() # only Python 3.8+ has parent_process
+    waitables = [connection] if parent is None else [connection, parent.sentinel]
+
+    game = None
+    while True:
+        try:
+            if connection not in multiprocessing.connection.wait(waitables):
+                return # our parent process died, so die with it
+            message = connection.recv()
+        except (EOFError, OSError):
+            return # our parent process died, so die with it
+
+        if message[0] == 'stop':
+            return
+        elif message[0] == 'state':
+            game = snapshot.loads(message[1])
+        else:
+            kind, generation, index, function, task = message
+            try:
+                returned = function(game, *snapshot.decode(task, game))
+                connection.send(('result', generation, index, snapshot.encode(returned)))
+            except Exception:
+                connection.send(('error', generation, index, traceback.format_exc()))
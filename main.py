@@ -2,7 +2,7 @@
 # Instead have a look at `README.md` for how to start writing you AI.
 
 import argparse
-from joueur.run import run
+from joueur.run import run, run_sessions, serve_workers
 
 parser = argparse.ArgumentParser(
     description=
@@ -18,7 +18,7 @@ parser.add_argument(
     action='store',
     dest='server',
     default='localhost',
-    help='the hostname or the server you want to connect to e.g. locahost:3000')
+    help='the hostname or the server you want to connect to e.g. locahost:3000, or unix:/path/to/socket for a server on this machine listening on a Unix domain socket')
 parser.add_argument(
     '-p',
     '--port',
@@ -77,5 +77,91 @@ parser.add_argument(
     action='store_true',
     dest='print_io',
     help='(debugging) print IO through the TCP socket to the terminal')
+parser.add_argument(
+    '--sessions',
+    action='store',
+    dest='sessions',
+    type=int,
+    default=1,
+    help=
+    'the number of game sessions to play at once in this process, each with its own connection to the server'
+)
+parser.add_argument(
+    '--logs',
+    action='store',
+    dest='logs',
+    choices=['direct', 'buffered', 'off'],
+    default='direct',
+    help='how GameObject.log calls are sent: direct, each as it is made, buffered, all at the end of the turn, or off, dropping them'
+)
+parser.add_argument(
+    '--logLimit',
+    action='store',
+    dest='log_limit',
+    type=int,
+    default=None,
+    help='the most buffered logs to send per turn, later ones are dropped'
+)
+parser.add_argument(
+    '--logReserve',
+    action='store',
+    dest='log_reserve',
+    type=float,
+    default=0.05,
+    help='drop a turn\'s buffered logs instead of sending them when fewer seconds than this are left in the turn\'s budget'
+)
+parser.add_argument(
+    '--profile',
+    action='store',
+    dest='profile',
+    choices=['cprofile', 'sampling', 'tracemalloc'],
+    default=None,
+    help='(debugging) profile the game, split by merging deltas, running the AI, and waiting on the network'
+)
+parser.add_argument(
+    '--profileOutput',
+    action='store',
+    dest='profile_output',
+    default='profile',
+    help='the directory to write the profile to'
+)
+parser.add_argument(
+    '--profileEvery',
+    action='store',
+    dest='profile_every',
+    type=int,
+    default=10,
+    help='the number of turns between tracemalloc snapshots when profiling with --profile=tracemalloc'
+)
+parser.add_argument(
+    '--trace',
+    action='store',
+    dest='trace',
+    default=None,
+    help='(debugging) write a timeline of the client\'s activity to this file, viewable in Perfetto or chrome://tracing'
+)
+parser.add_argument(
+    '--importProfile',
+    action='store_true',
+    dest='import_profile',
+    help='(debugging) report how long the client takes to start, and which imports it spends that time on, without connecting'
+)
+parser.add_argument(
+    '--serveWorkers',
+    action='store',
+    dest='serve_workers',
+    type=int,
+    default=None,
+    help='load the game and AI once, then fork a process to play each session requested on this localhost port'
+)
 
-run(parser.parse_args())
+args = parser.parse_args()
+if args.import_profile:
+    from joueur.import_profile import report
+    report(args.game)
+elif args.serve_workers is not None:
+    serve_workers(args, args.serve_workers)
+elif args.sessions > 1:
+    run_sessions(args, args.sessions)
+else:
+    run(args)
@@ -0,0 +1,105 @@
+# Round trips random nested args through serialize, JSON, and deserialize,
+# checking lists, tuples, and sets all arrive as lists with the same values.
+import json
+import random
+import unittest
+from joueur.base_game_object import BaseGameObject
+from joueur.game_manager import GameManager
+from joueur.serializer import serialize, deserialize
+from joueur.synthetic import SyntheticGame, CONSTANTS
+
+_KEYS = ['a', 'b', 'path', 'target', 'x', 'y', '']
+_STRINGS = ['', 'land', 'water', 'move', 'ünïcödé', '&RM']
+
+
+def _game():
+    synthetic = SyntheticGame('pirates', objects=200)
+    manager = GameManager(synthetic._game)
+    manager.set_constants(CONSTANTS)
+    manager.apply_delta_state(synthetic.initial_delta())
+    return synthetic._game
+
+
+# a random value of something hashable, for sets and tuples in sets
+def _random_hashable(rng, game_objects, depth):
+    kind = rng.randrange(6 if depth > 0 else 5)
+    if kind == 0:
+        return rng.randint(-2 ** 40, 2 ** 40)
+    if kind == 1:
+        return rng.uniform(-1e6, 1e6)
+    if kind == 2:
+        return rng.choice(_STRINGS)
+    if kind == 3:
+        return rng.choice([True, False, None])
+    if kind == 4:
+        return rng.choice(game_objects)
+    return tuple(_random_hashable(rng, game_objects, depth - 1) for i in range(rng.randrange(4)))
+
+
+def _random_value(rng, game_objects, depth):
+    kind = rng.randrange(9 if depth > 0 else 5)
+    if kind < 5:
+        return _random_hashable(rng, game_objects, 0)
+    length = rng.randrange(5)
+    if kind == 5:
+        return [_random_value(rng, game_objects, depth - 1) for i in range(length)]
+    if kind == 6:
+        return tuple(_random_value(rng, game_objects, depth - 1) for i in range(length))
+    if kind == 7:
+        return set(_random_hashable(rng, game_objects, depth - 1) for i in range(length))
+    # never just an 'id' key, as that is how game object references are sent
+    return {rng.choice(_KEYS): _random_value(rng, game_objects, depth - 1) for i in range(length)}
+
+
+# what a value should look like after the round trip
+def _normalized(value):
+    if isinstance(value, BaseGameObject):
+        return value
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_normalized(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalized(v) for k, v in value.items()}
+    return value
+
+
+# @class TestSerializerRoundTrip: random args survive being sent to the server and back
+class TestSerializerRoundTrip(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.game = _game()
+        cls.game_objects = list(cls.game.game_objects.values())
+
+    def round_trip(self, value):
+        return deserialize(json.loads(json.dumps(serialize(value))), self.game)
+
+    def test_random_values(self):
+        rng = random.Random(0)
+        for i in range(2000):
+            value = _random_value(rng, self.game_objects, rng.randrange(6))
+            self.assertEqual(self.round_trip(value), _normalized(value), value)
+
+    def test_game_objects_stay_the_same_instances(self):
+        game_objects = self.game_objects[:20]
+        returned = self.round_trip({'path': tuple(game_objects)})
+        for sent, received in zip(game_objects, returned['path']):
+            self.assertIs(received, sent)
+
+    def test_sub_classes(self):
+        class Path(list):
+            pass
+
+        class Plan(dict):
+            pass
+
+        value = Plan(steps=Path(self.game_objects[:3]), at=frozenset([1]))
+        self.assertEqual(self.round_trip(value), {'steps': self.game_objects[:3], 'at': [1]})
+
+    def test_deeply_nested(self):
+        value = []
+        for i in range(200):
+            value = [value, (i,)]
+        self.assertEqual(self.round_trip(value), _normalized(value))
+
+
+if __name__ == '__main__':
+    unittest.main()